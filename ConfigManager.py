@@ -2,11 +2,10 @@
     File containing several utility methods that handle saving and loading of configuration files, and processing of command line arguments
 """
 import yaml
+import copy
 import logging
 import ntpath
-import glob
 import os
-import numpy as np
 from IStradaStateDef import DebugMode
 from typing import TypeVar, Dict, Tuple
 
@@ -14,6 +13,12 @@ T = TypeVar('T')
 
 curLogger = logging.getLogger("mainLogger")
 
+# libyaml's loader when PyYAML was built with it, same FullLoader semantics either way
+YAMLLoader = getattr(yaml, "CFullLoader", yaml.FullLoader)
+
+# Parsed config files: path -> (mtime_ns, controlOptions)
+_configCache = {}
+
 
 def getConfigFileID(filePath):
     _, baseName = ntpath.split(filePath)
@@ -32,33 +37,53 @@ def getConfigFileID(filePath):
             return 0
 
 
-def importConfigFile(filePath):
+def loadConfigFile(filePath):
+    """Parse a YAML config file, reusing the previous parse while its mtime is unchanged."""
+    mtime = os.stat(filePath).st_mtime_ns
+    cached = _configCache.get(filePath)
+    if cached is None or cached[0] != mtime:
+        with open(filePath) as file:
+            cached = (mtime, yaml.load(file, Loader=YAMLLoader))
+        _configCache[filePath] = cached
+
+    # Callers edit what they get back, keep the cached copy pristine
+    return copy.deepcopy(cached[1])
+
+
+def findLatestConfigFile(filePath):
     folderPath, baseName = ntpath.split(filePath)
     baseNameNoExt = baseName[:-5]
 
-    configFiles = glob.glob(os.path.join(folderPath, baseNameNoExt + "*"))
-    configFiles = sorted(configFiles)
+    # Single pass over the folder, keeping the highest version seen
+    numFiles = 0
+    latest = None
+    try:
+        with os.scandir(folderPath or ".") as entries:
+            for entry in entries:
+                if not entry.name.startswith(baseNameNoExt):
+                    continue
+                numFiles += 1
+                candidate = (getConfigFileID(entry.name), entry.name)
+                if latest is None or candidate > latest:
+                    latest = candidate
+    except FileNotFoundError:
+        # Reported when the file itself fails to open
+        return filePath, 0
 
-    # Choose the latest config file
-    # Extract IDs
-    fileIDs = []
-    for fileP in configFiles:
-        fileIDs.append(getConfigFileID(fileP))
+    if numFiles > 1:
+        return os.path.join(folderPath, latest[1]), numFiles
+    return filePath, numFiles
 
-    sortedIdx = np.argsort(fileIDs)
 
-    chosenConfigFile = filePath
+def importConfigFile(filePath):
+    chosenConfigFile, numFiles = findLatestConfigFile(filePath)
     print(filePath)
-    if len(fileIDs) > 1:
+    if numFiles > 1:
         curLogger.info("Detected multiple versions of the base configuration file. Picking the latest")
-        curLogger.info("Latest File Path -> %s", configFiles[sortedIdx[-1]])
-        chosenConfigFile = configFiles[sortedIdx[-1]]
+        curLogger.info("Latest File Path -> %s", chosenConfigFile)
 
     try:
-        with open(chosenConfigFile) as file:
-            # The FullLoader parameter handles the conversion from YAML
-            # scalar values to Python the dictionary format
-            controlOptions = yaml.load(file, Loader=yaml.FullLoader)
+        controlOptions = loadConfigFile(chosenConfigFile)
     except FileNotFoundError:
         curLogger.critical("Configuration file not found. Please check the file name and path.")
         exit()
@@ -274,12 +299,9 @@ def saveConfigFile(zoomTopLeft, zoomBotLeft, markerCropTopLeft, markerCropBotLef
     folderPath, baseName = ntpath.split(originalFilePath)
     baseNameNoExt = baseName[:-5]
 
-    # Load the original File
+    # Load the original File, usually still cached from importConfigFile
     try:
-        with open(originalFilePath) as file:
-            # The FullLoader parameter handles the conversion from YAML
-            # scalar values to Python the dictionary format
-            controlOptions = yaml.load(file, Loader=yaml.FullLoader)
+        controlOptions = loadConfigFile(originalFilePath)
     except FileNotFoundError:
         curLogger.critical("Configuration file not found. Please check the file name and path.")
         exit()
@@ -117,6 +117,11 @@ class Advertisement(dbus.service.Object):
     def Release(self):
         print ('%s: Released!' % self.path)
 
+    @dbus.service.signal(DBUS_PROP_IFACE,
+                         signature='sa{sv}as')
+    def PropertiesChanged(self, interface, changed, invalidated):
+        pass
+
     def register_ad_callback(self):
         print("GATT advertisement registered")
 
@@ -124,7 +129,7 @@ class Advertisement(dbus.service.Object):
         print("Failed to register GATT advertisement")
 
     def register(self):
-        bus = BleTools.get_bus()
+        bus = self.bus
         adapter = BleTools.find_adapter(bus)
 
         ad_manager = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, adapter),
@@ -132,3 +137,11 @@ class Advertisement(dbus.service.Object):
         ad_manager.RegisterAdvertisement(self.get_path(), {},
                                      reply_handler=self.register_ad_callback,
                                      error_handler=self.register_ad_error_callback)
+
+    def unregister(self):
+        bus = self.bus
+        adapter = BleTools.find_adapter(bus)
+
+        ad_manager = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, adapter),
+                                LE_ADVERTISING_MANAGER_IFACE)
+        ad_manager.UnregisterAdvertisement(self.get_path())
@@ -0,0 +1,114 @@
+from collections import namedtuple
+from types import MappingProxyType
+import json
+import logging
+import os
+
+CONFIG_PATH = "/home/AnarPi/Desktop/ble_gatt/Config.json"
+
+SensorPins = namedtuple("SensorPins", ["rpm_pin", "hall_pin", "flow_pin"])
+FlowCalibration = namedtuple("FlowCalibration", ["pulses_per_gallon", "max_flow_rate_lpm"])
+RPMCalibration = namedtuple("RPMCalibration", ["filter", "size", "tolerance"])
+
+# Keys of calc_rp_.RPM_FILTERS, checked here so a bad file is rejected before it is applied
+RPM_FILTER_KINDS = ("moving_average", "median", "exponential")
+
+_config = None
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class AppConfig:
+    """
+    Config.json parsed once into read-only sections. config["logging"] and
+    friends return frozen mappings, the sensor settings are also exposed as
+    namedtuples. watch() polls the file mtime on the GLib main loop and, on a
+    change, swaps in the new sections and calls every listener with
+    (config, changed_section_names).
+    """
+    def __init__(self, path=CONFIG_PATH):
+        self.path = path
+        self.logger = logging.getLogger('BluetoothService')
+        self.listeners = []
+        self.watch_source = None
+        self.mtime = os.stat(path).st_mtime_ns
+        self._apply(self._read())
+        self.logger.info(f"Configuration loaded from {path}")
+
+    def __getitem__(self, section):
+        return self.sections[section]
+
+    def _read(self):
+        with open(self.path, 'r') as file:
+            return _freeze(json.load(file))
+
+    def _apply(self, sections):
+        sensors = sections["raspberrypi_sensors"]
+        water_meter = sensors["water_meter"]
+        estimator = sections["dataEstimator"]
+        pins = SensorPins(sensors["rpm_sensor"]["rpm_pin"],
+                          sensors["hall_sensor"]["direction_pin"],
+                          water_meter["flow_pin"])
+        flow_calibration = FlowCalibration(water_meter["pulses_per_gallon"],
+                                           water_meter["max_flow_rate_lpm"])
+        rpm_calibration = RPMCalibration(estimator["filter"], estimator["numFrames4Average"],
+                                         sections["serverInformation"]["toleranceRotation"])
+        if rpm_calibration.filter not in RPM_FILTER_KINDS:
+            raise ValueError(f"Unknown dataEstimator.filter {rpm_calibration.filter!r}")
+        if not isinstance(rpm_calibration.size, int) or rpm_calibration.size < 1:
+            raise ValueError(f"dataEstimator.numFrames4Average must be at least 1, not {rpm_calibration.size!r}")
+        if flow_calibration.pulses_per_gallon <= 0 or flow_calibration.max_flow_rate_lpm <= 0:
+            raise ValueError(f"Flow meter calibration must be positive, not {tuple(flow_calibration)}")
+        # Swapped in only once every section parsed
+        self.sections = sections
+        self.pins = pins
+        self.flow_calibration = flow_calibration
+        self.rpm_calibration = rpm_calibration
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def watch(self, interval):
+        # GLib only here, so the sensor modules stay usable without a main loop
+        from gi.repository import GLib
+        if self.watch_source is None:
+            self.watch_source = GLib.timeout_add(int(interval * 1000), self.check)
+
+    def check(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self.mtime:
+                return True
+            # A half-written file is retried when its next write moves the mtime
+            self.mtime = mtime
+            sections = self._read()
+            old_sections = self.sections
+            self._apply(sections)
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.info(f"Error while reloading {self.path}, keeping the previous configuration : {e}")
+            return True
+
+        changed = {name for name in set(sections) | set(old_sections)
+                   if sections.get(name) != old_sections.get(name)}
+        if changed:
+            self.logger.info(f"Configuration reloaded, changed sections: {sorted(changed)}")
+            for callback in self.listeners:
+                try:
+                    callback(self, changed)
+                except Exception as e:
+                    self.logger.info(f"Error while applying the new configuration : {e}")
+        return True
+
+
+def get_config(path=None):
+    """The process-wide AppConfig, parsed on first use (or when `path` differs)."""
+    global _config
+    if _config is None or (path is not None and path != _config.path):
+        _config = AppConfig(path or CONFIG_PATH)
+    return _config
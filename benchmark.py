@@ -0,0 +1,320 @@
+#!/usr/bin/python3
+"""
+End-to-end benchmark of the GATT server.
+
+Starts a private dbus-daemon, runs Application/IstradaService in a child
+process with simulated sensors and measures it as a D-Bus client: ReadValue
+latency per characteristic, read and notification throughput, startup time
+and memory. Pulse callback cost is measured in-process on mock pins.
+
+    python3 benchmark.py --output bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_BUS_NAME = "org.istrada.Benchmark"
+GATT_CHRC_IFACE = "org.bluez.GattCharacteristic1"
+DBUS_OM_IFACE = "org.freedesktop.DBus.ObjectManager"
+DBUS_PROP_IFACE = "org.freedesktop.DBus.Properties"
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(latencies_us):
+    latencies_us = sorted(latencies_us)
+    return {
+        "count": len(latencies_us),
+        "mean_us": sum(latencies_us) / len(latencies_us),
+        "p50_us": percentile(latencies_us, 50),
+        "p90_us": percentile(latencies_us, 90),
+        "p99_us": percentile(latencies_us, 99),
+        "max_us": latencies_us[-1],
+    }
+
+
+def rss_kib(pid):
+    with open(f"/proc/{pid}/status") as file:
+        for line in file:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return None
+
+
+def make_config(workdir):
+    with open(os.path.join(HERE, "Config.json")) as file:
+        config = json.load(file)
+    config["simulation"]["enabled"] = True
+    config["logging"]["level"] = "WARNING"
+    config["logging"]["localBackup"]["folder"] = os.path.join(workdir, "backup")
+    config["checkpoint"]["path"] = os.path.join(workdir, "totals.ckpt")
+
+    config_path = os.path.join(workdir, "Config.json")
+    with open(config_path, "w") as file:
+        json.dump(config, file)
+    return config_path
+
+
+def start_bus():
+    bus_proc = subprocess.Popen(["dbus-daemon", "--session", "--nofork", "--print-address=1"],
+                                stdout=subprocess.PIPE, text=True)
+    address = bus_proc.stdout.readline().strip()
+    return bus_proc, address
+
+
+def serve(address, config_path, notify_interval):
+    import dbus
+    import dbus.mainloop.glib
+    import dbus.service
+    dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+
+    from bletools import BleTools
+    BleTools.bus = dbus.bus.BusConnection(address)
+
+    import ble_comm
+    import sensorsim
+    from appconfig import get_config
+    from service import Application
+
+    config = get_config(config_path)
+    sensorsim.install()
+    simulator = sensorsim.from_config(config)
+
+    # No BlueZ on the private bus: export the objects and claim a name instead of registering
+    app = Application()
+    service = ble_comm.IstradaService(0, notify_interval)
+    simulator.start()
+    app.add_service(service)
+    app.GetManagedObjects()
+    bus_name = dbus.service.BusName(BENCH_BUS_NAME, BleTools.bus)
+    app.run()
+
+
+def wait_for_server(bus, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if bus.name_has_owner(BENCH_BUS_NAME):
+            return
+        time.sleep(0.005)
+    raise RuntimeError("Benchmark server did not come up")
+
+
+def bench_reads(bus, objects, reads):
+    import dbus
+
+    results = {}
+    for path, interfaces in sorted(objects.items()):
+        chrc = interfaces.get(GATT_CHRC_IFACE)
+        if chrc is None or "read" not in chrc["Flags"]:
+            continue
+
+        iface = dbus.Interface(bus.get_object(BENCH_BUS_NAME, path), GATT_CHRC_IFACE)
+        options = dbus.Dictionary({}, signature="sv")
+        iface.ReadValue(options)
+
+        latencies = []
+        for _ in range(reads):
+            start = time.perf_counter()
+            iface.ReadValue(options)
+            latencies.append((time.perf_counter() - start) * 1e6)
+
+        result = summarize(latencies)
+        result["path"] = str(path)
+        results[str(chrc["UUID"])] = result
+    return results
+
+
+def bench_read_rate(bus, path, duration, window):
+    """Completed ReadValue calls per second with `window` calls in flight."""
+    import dbus
+    from gi.repository import GLib
+
+    iface = dbus.Interface(bus.get_object(BENCH_BUS_NAME, path), GATT_CHRC_IFACE)
+    options = dbus.Dictionary({}, signature="sv")
+    loop = GLib.MainLoop()
+    state = {"done": 0, "errors": 0}
+    deadline = time.monotonic() + duration
+
+    def issue():
+        iface.ReadValue(options, reply_handler=on_reply, error_handler=on_error)
+
+    def on_reply(value):
+        state["done"] += 1
+        next_call()
+
+    def on_error(error):
+        state["errors"] += 1
+        next_call()
+
+    def next_call():
+        if time.monotonic() < deadline:
+            issue()
+        else:
+            loop.quit()
+
+    for _ in range(window):
+        issue()
+    start = time.monotonic()
+    loop.run()
+    elapsed = time.monotonic() - start
+    return {"path": str(path), "window": window, "reads_per_s": state["done"] / elapsed,
+            "errors": state["errors"]}
+
+
+def bench_notify_rate(bus, path, duration, notify_interval):
+    import dbus
+    from gi.repository import GLib
+
+    obj = bus.get_object(BENCH_BUS_NAME, path)
+    iface = dbus.Interface(obj, GATT_CHRC_IFACE)
+    loop = GLib.MainLoop()
+    count = [0]
+
+    def on_changed(interface, changed, invalidated):
+        if "Value" in changed:
+            count[0] += 1
+
+    match = obj.connect_to_signal("PropertiesChanged", on_changed, dbus_interface=DBUS_PROP_IFACE)
+    iface.StartNotify()
+    start = time.monotonic()
+    GLib.timeout_add(int(duration * 1000), loop.quit)
+    loop.run()
+    elapsed = time.monotonic() - start
+    iface.StopNotify()
+    match.remove()
+    return {"path": str(path), "notify_interval_ms": notify_interval,
+            "notifications_per_s": count[0] / elapsed}
+
+
+def bench_pulses(config_path, frequencies, duration):
+    """Cost of one rising+falling edge, including the sensor callback, on mock pins."""
+    import sensorsim
+    from appconfig import get_config
+    from calc_rp_ import RPMSensor
+    from cx_flowmtr import GetFlow
+
+    factory = sensorsim.install()
+    config = get_config(config_path)
+    rpm_sensor = RPMSensor(config=config)
+    flow_sensor = GetFlow(config=config)
+    inputs = (
+        ("rpm", factory.pin(config.pins.rpm_pin), lambda: rpm_sensor.drum_cnt),
+        ("flow", factory.pin(config.pins.flow_pin), lambda: flow_sensor.total_pulses),
+    )
+
+    results = []
+    for frequency in frequencies:
+        for name, pin, counted in inputs:
+            pulses = int(frequency * duration)
+            before = counted()
+            cost = 0.0
+            start = next_edge = time.perf_counter()
+            for _ in range(pulses):
+                edge_start = time.perf_counter()
+                pin.drive_high()
+                pin.drive_low()
+                cost += time.perf_counter() - edge_start
+                next_edge += 1.0 / frequency
+                delay = next_edge - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            elapsed = time.perf_counter() - start
+            results.append({
+                "input": name,
+                "target_hz": frequency,
+                "achieved_hz": pulses / elapsed,
+                "cost_per_pulse_us": cost / pulses * 1e6,
+                "lost_pulses": pulses - (counted() - before),
+            })
+
+    rpm_sensor.close()
+    flow_sensor.close()
+    return results
+
+
+def run(args):
+    import dbus
+    import dbus.mainloop.glib
+    dbus.mainloop.glib.DBusGMainLoop(set_as_default=True)
+
+    results = {
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+    }
+    with tempfile.TemporaryDirectory() as workdir:
+        config_path = make_config(workdir)
+        bus_proc, address = start_bus()
+        server = None
+        try:
+            start = time.monotonic()
+            server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", address,
+                                       config_path, str(args.notify_interval)])
+            bus = dbus.bus.BusConnection(address)
+            wait_for_server(bus)
+            manager = dbus.Interface(bus.get_object(BENCH_BUS_NAME, "/"), DBUS_OM_IFACE)
+            objects = manager.GetManagedObjects()
+            results["startup_to_registered_s"] = time.monotonic() - start
+            results["managed_objects"] = len(objects)
+            results["memory_kib"] = {"after_startup": rss_kib(server.pid)}
+
+            telemetry_path = None
+            for path, interfaces in objects.items():
+                chrc = interfaces.get(GATT_CHRC_IFACE)
+                if chrc is not None and str(chrc["UUID"]) == args.throughput_uuid:
+                    telemetry_path = path
+
+            results["read_latency"] = bench_reads(bus, objects, args.reads)
+            if telemetry_path is not None:
+                results["read_rate"] = bench_read_rate(bus, telemetry_path, args.duration, args.window)
+                results["notify_rate"] = bench_notify_rate(bus, telemetry_path, args.duration,
+                                                           args.notify_interval)
+            results["memory_kib"]["after_run"] = rss_kib(server.pid)
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+            bus_proc.terminate()
+            bus_proc.wait()
+
+        results["pulse_callbacks"] = bench_pulses(config_path, args.pulse_frequencies,
+                                                  args.pulse_duration)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Benchmark results written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GATT server performance benchmark")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--reads", type=int, default=500, help="ReadValue calls per characteristic")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per throughput test")
+    parser.add_argument("--window", type=int, default=8, help="reads in flight for the rate test")
+    parser.add_argument("--notify-interval", type=int, default=1, help="server notify interval in ms")
+    parser.add_argument("--throughput-uuid", default="1c5a5e5e-4b7c-4919-a4fb-dddce685299e",
+                        help="characteristic used for the rate tests (default: packed telemetry)")
+    parser.add_argument("--pulse-frequencies", type=int, nargs="+", default=[10, 100, 500, 1000, 2000])
+    parser.add_argument("--pulse-duration", type=float, default=1.0)
+    parser.add_argument("--serve", nargs=3, metavar=("ADDRESS", "CONFIG", "NOTIFY_MS"),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        address, config_path, notify_interval = args.serve
+        serve(address, config_path, int(notify_interval))
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
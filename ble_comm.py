@@ -1,42 +1,245 @@
 #!/usr/bin/python3
 
 import dbus
-from advertisement import Advertisement
-from service import Application, Service, Characteristic, Descriptor
+from advertisement import Advertisement, LE_ADVERTISEMENT_IFACE
+from appconfig import get_config
+from bletools import BleTools
+from service import Application, Service, Characteristic, NotifyCharacteristic, Descriptor, InvalidArgsException
 from gpiozero import CPUTemperature
 from gi.repository import GLib
 from cx_flowmtr import *
 from calc_rp_ import *
+from checkpoint import TotalsCheckpoint
+from filetransfer import FileTransfer
+from pulsetools import EdgeBatchReader
+from samplestore import SampleStore
+from logsetup import setup_logging
+from telemetry import TelemetrySource, SampleRecorder, pack_sample, pack_batch, pack_broadcast, TELEMETRY_STRUCT, BATCH_HEADER_STRUCT
+import struct
 from datetime import datetime
+import subprocess
+import threading
+import time
 import logging
 
 GATT_CHRC_IFACE = "org.bluez.GattCharacteristic1"
 NOTIFY_TIMEOUT = 5000
-logging.basicConfig(filename='/home/AnarPi/Desktop/ble_gatt/blestatus.log', level=logging.INFO, format='%(asctime)s - %(message)s')
+TIME_SYNC_TOLERANCE = 2.0
+HISTORY_NOTIFY_INTERVAL = 15
+# BLE default before any MTU exchange
+MIN_ATT_MTU = 23
+logger = logging.getLogger('BluetoothService')
+
+
+def samples_per_notification(mtu):
+    # 0: not even one sample fits behind a batch header, send bare records
+    return max(0, (mtu - 3 - BATCH_HEADER_STRUCT.size) // TELEMETRY_STRUCT.size)
+
+
+def pack_notification(samples, per_notification):
+    # A bare record starts with version << 4, a batch header with the version
+    # itself, so clients tell the two apart from the first byte
+    if per_notification == 0:
+        return pack_sample(samples[0])
+    return pack_batch(samples)
 
 
 class IstradaAdvertisement(Advertisement):
-    def __init__(self, index):
+    # Bluetooth SIG reserved "test" company identifier
+    MANUFACTURER_ID = 0xFFFF
+
+    def __init__(self, index, recorder=None, broadcast_config=None):
         Advertisement.__init__(self, index, "peripheral")
         self.add_local_name("pi5_ble")
         
         self.include_tx_power = True
+        self.recorder = recorder
+        self.reregister = False
+        if recorder is not None and broadcast_config and broadcast_config["enabled"]:
+            self.reregister = broadcast_config["reregister"]
+            self.update_manufacturer_data()
+            GLib.timeout_add(int(broadcast_config["refreshInterval"] * 1000), self.refresh_broadcast)
+
+    def update_manufacturer_data(self):
+        self.add_manufacturer_data(self.MANUFACTURER_ID, pack_broadcast(self.recorder.latest()))
+
+    def refresh_broadcast(self):
+        # Live mixer state for any scanner, no GATT connection needed
+        self.update_manufacturer_data()
+        if self.reregister:
+            self.unregister()
+            self.register()
+        else:
+            self.PropertiesChanged(LE_ADVERTISEMENT_IFACE,
+                                   {"ManufacturerData": self.manufacturer_data}, [])
+        return True
 
 class IstradaService(Service):
     ISTRADA_SVC_UUID = "20bb0d58-b635-4113-9db7-f4e4e37e3985"
 
-    def __init__(self, index):
-        rpm_sensor = RPMSensor()
-        
+    def __init__(self, index, notify_interval=None):
         self.logger = logging.getLogger('BluetoothService')
-        self.bus = dbus.SystemBus()
+        self.config = config = get_config()
+        self.server_config = config["serverInformation"]
+        # An explicit interval (ms) overrides serverInformation.notifyInterval (s) and reloads
+        self.fixed_notify_interval = notify_interval is not None
+        if notify_interval is None:
+            notify_interval = int(self.server_config["notifyInterval"] * 1000)
+        # Start idle: sensors only count pulses until a client shows up
+        idle_rate = self.server_config["idleSamplingRate"]
+        ingestion = config["ingestion"]
+        batched = ingestion["mode"] == "batched" and not config["simulation"]["enabled"]
+        if batched and not EdgeBatchReader.available():
+            self.logger.warning("libgpiod bindings not found, falling back to per-edge callbacks")
+            batched = False
+        self.rpm_sensor = rpm_sensor = RPMSensor(idle_rate, config=config, batched=batched)
+        self.flow_sensor = flow_sensor = GetFlow(idle_rate, config=config, batched=batched)
+        checkpoint_config = config["checkpoint"]
+        self.checkpoint = TotalsCheckpoint(checkpoint_config["path"], checkpoint_config["interval"])
+        forward, reverse, flow_pulses = self.checkpoint.load()
+        rpm_sensor.restore(forward, reverse)
+        flow_sensor.restore(flow_pulses)
+        self.checkpoint.start(self.get_totals)
+        self.edge_reader = None
+        if batched:
+            self.start_edge_reader()
+        config.add_listener(self.on_config_changed)
+        flow_sensor.when_over_limit = self.on_flow_over_limit
+        backup_config = config["logging"]["localBackup"]
+        self.store = SampleStore(backup_config["folder"], backup_config["maxStoredSamples"],
+                                 backup_config["frequency"])
+        # Continue the sequence numbers already on disk
+        self.telemetry = TelemetrySource(rpm_sensor, flow_sensor, self.store.last_seq)
+        self.broadcast_config = config["broadcast"]
+        update_frequency = self.server_config["updateFrequency"]
+        max_samples = self.server_config["maxSamplesPerMessage"]
+        self.recorder = SampleRecorder(self.telemetry, self.recorder_capacity())
+        self.connected_devices = set()
+        self.active = False
+        
+        self.bus = BleTools.get_bus()
         self.add_service_status_changed_handler()
         Service.__init__(self,index, self.ISTRADA_SVC_UUID, True)
-        self.add_characteristic(RpmCharacteristic(self,rpm_sensor))
-        self.add_characteristic(DrumCharacteristic(self,rpm_sensor))
-        self.add_characteristic(FlowCharacteristic(self))
+        # Characteristics pushing on the notifyInterval timer
+        self.periodic_characteristics = []
+        self.add_periodic_characteristic(RpmCharacteristic(self,rpm_sensor,notify_interval))
+        self.add_periodic_characteristic(DrumCharacteristic(self,rpm_sensor,notify_interval))
+        self.add_periodic_characteristic(FlowCharacteristic(self,flow_sensor,notify_interval))
         self.add_characteristic(TimeCharacteristic(self))
-        self.add_characteristic(FileReceiveCharacteristic(self))
+        self.file_status = file_status = FileStatusCharacteristic(self, config["fileTransfer"])
+        self.add_characteristic(FileReceiveCharacteristic(self,file_status))
+        self.add_characteristic(file_status)
+        self.add_periodic_characteristic(TelemetryCharacteristic(self,self.recorder,notify_interval))
+        self.sample_batch = SampleBatchCharacteristic(self,self.recorder,max_samples,
+                                                      int(update_frequency * 1000),
+                                                      self.server_config["attMtu"])
+        self.add_characteristic(self.sample_batch)
+        self.add_characteristic(HistoryCharacteristic(self))
+        self.record_source = GLib.timeout_add(int(idle_rate * 1000), self.record_sample)
+
+    def add_periodic_characteristic(self, characteristic):
+        self.periodic_characteristics.append(characteristic)
+        self.add_characteristic(characteristic)
+
+    def start_edge_reader(self):
+        ingestion = self.config["ingestion"]
+        self.edge_reader = EdgeBatchReader(ingestion["chip"], {
+            self.rpm_sensor.rpmpin: self.rpm_sensor.add_edges,
+            self.flow_sensor.FLOW_METER_PIN: self.flow_sensor.add_edges,
+        }, ingestion["batchInterval"])
+        self.edge_reader.when_failed = self.on_edge_reader_failed
+        self.edge_reader.start()
+
+    def on_edge_reader_failed(self, error):
+        # Runs on the reader thread, switch the sensors over on the main loop
+        GLib.idle_add(self.use_edge_callbacks)
+
+    def use_edge_callbacks(self):
+        self.logger.warning("Batched edge ingestion failed, falling back to per-edge callbacks")
+        self.edge_reader = None
+        try:
+            self.rpm_sensor.use_edge_callbacks()
+            self.flow_sensor.use_edge_callbacks()
+        except Exception as e:
+            self.logger.error(f"No pulse input available, rpm and flow are not counted : {e}")
+        return False
+
+    def on_config_changed(self, config, changed):
+        # Applied in place: the GATT objects and the BlueZ registration stay up
+        self.server_config = config["serverInformation"]
+        self.rpm_sensor.apply_config(config)
+        self.flow_sensor.apply_config(config)
+        if self.edge_reader is not None and \
+                set(self.edge_reader.handlers) != {config.pins.rpm_pin, config.pins.flow_pin}:
+            self.edge_reader.stop()
+            self.start_edge_reader()
+        if "serverInformation" in changed:
+            self.apply_sampling_rate()
+            self.apply_notify_intervals()
+
+    def apply_notify_intervals(self):
+        if not self.fixed_notify_interval:
+            notify_interval = int(self.server_config["notifyInterval"] * 1000)
+            for characteristic in self.periodic_characteristics:
+                if characteristic.notify_interval != notify_interval:
+                    characteristic.set_notify_interval(notify_interval)
+        update_interval = int(self.server_config["updateFrequency"] * 1000)
+        if self.sample_batch.notify_interval != update_interval:
+            self.sample_batch.set_notify_interval(update_interval)
+
+    def record_sample(self):
+        self.store.append(self.recorder.record())
+        return True
+
+    def samples_since(self, seq, limit):
+        # Recent samples come from memory, older ones from the local store
+        samples = self.recorder.samples
+        if samples and seq + 1 >= samples[0].seq:
+            return self.recorder.since(seq, limit)
+        return self.store.since(seq, limit)
+
+    def get_totals(self):
+        return (self.rpm_sensor.forward_cnt, self.rpm_sensor.reverse_cnt,
+                self.flow_sensor.total_pulses)
+
+    def on_flow_over_limit(self, over_limit, flow_rate_lpm):
+        # Runs on the flow sampler thread, only on transitions
+        if over_limit:
+            self.logger.warning(f"Flow rate {flow_rate_lpm:.1f} LPM exceeds the maximum limit")
+        else:
+            self.logger.info(f"Flow rate back below the maximum limit: {flow_rate_lpm:.1f} LPM")
+
+    def subscription_changed(self, characteristic):
+        self.update_activity()
+
+    def update_activity(self):
+        active = bool(self.connected_devices) or \
+            any(getattr(chrc, "notifying", False) for chrc in self.characteristics)
+        if active == self.active:
+            return
+
+        self.active = active
+        self.apply_sampling_rate()
+
+    def recorder_capacity(self):
+        # Two updates' worth, so a batch notification never outruns the buffer
+        sampling_rate = self.server_config["samplingRate"]
+        update_frequency = self.server_config["updateFrequency"]
+        max_samples = self.server_config["maxSamplesPerMessage"]
+        samples_per_update = max(1, int(round(update_frequency / sampling_rate)))
+        return 2 * max(samples_per_update, max_samples)
+
+    def apply_sampling_rate(self):
+        self.recorder.resize(self.recorder_capacity())
+        if self.active:
+            rate = self.server_config["samplingRate"]
+        else:
+            rate = self.server_config["idleSamplingRate"]
+        self.logger.info(f"Switching to {'active' if self.active else 'idle'} sampling every {rate} s")
+        self.rpm_sensor.sampler.set_period(rate)
+        self.flow_sensor.sampler.set_period(rate)
+        GLib.source_remove(self.record_source)
+        self.record_source = GLib.timeout_add(int(rate * 1000), self.record_sample)
 
     def add_service_status_changed_handler(self):
         self.bus.add_signal_receiver(
@@ -51,33 +254,34 @@ class IstradaService(Service):
         if "Connected" in changed:
             connected = changed["Connected"]
             if connected:
+                self.connected_devices.add(path)
                 self.logger.info(f"Device connected: {path}")
-                print(f"Device connected: {path}")
             else:
+                self.connected_devices.discard(path)
                 self.logger.info(f"Device disconnected: {path}")
-                print(f"Device disconnected: {path}")
+            self.update_activity()
 
 # 
-class RpmCharacteristic(Characteristic):
+class RpmCharacteristic(NotifyCharacteristic):
     RPM_CHARACTERISTIC_UUID = "128a6cdd-56fe-4859-881d-216088fc587d"
 
-    def __init__(self, service,rpm_char):
-        self.notifying = False
-        
+    def __init__(self, service,rpm_char,notify_interval=NOTIFY_TIMEOUT):
         self.currRpm = 0
         self.revolution = 0
         self.rpm_char = rpm_char
-        Characteristic.__init__(
+        NotifyCharacteristic.__init__(
                 self, self.RPM_CHARACTERISTIC_UUID,
-                ["notify", "read"], service)
+                ["notify", "read"], service, notify_interval)
         self.add_descriptor(RpmDescriptor(self))
 
+    def get_value(self):
+        self.currRpm = self.rpm_char.get_snapshot().rpm
+        value =str(self.currRpm)
+        return bytearray([dbus.Byte(c.encode()) for c in value])
 
     def ReadValue(self, options):
-        self.currRpm,_= self.rpm_char.update_rpm()
-        value =str(self.currRpm)
-        value = bytearray([dbus.Byte(c.encode()) for c in value])
-        print(value)
+        value = self.get_value()
+        logger.debug("RPM read: %s", value)
         return value
 
 
@@ -101,22 +305,24 @@ class RpmDescriptor(Descriptor):
         return bytearray(value)
 
 
-class DrumCharacteristic(Characteristic):
+class DrumCharacteristic(NotifyCharacteristic):
     DRUM_CHARACTERISTIC_UUID = "a86b7763-800f-404e-b965-74e6a19ab4f9"
 
-    def __init__(self, service,rev_char):
-        self.notifying = False
+    def __init__(self, service,rev_char,notify_interval=NOTIFY_TIMEOUT):
         self.rev_char = rev_char
-        Characteristic.__init__(
+        NotifyCharacteristic.__init__(
                 self, self.DRUM_CHARACTERISTIC_UUID,
-                ["notify", "read"], service)
+                ["notify", "read"], service, notify_interval)
         self.add_descriptor(DrumDescriptor(self))
 
-    def ReadValue(self, options):
-        _,self.revolution = self.rev_char.update_rpm()
+    def get_value(self):
+        self.revolution = self.rev_char.get_snapshot().drum_cnt
         value = str(self.revolution)
-        value = bytearray([dbus.Byte(c.encode()) for c in value])
-        print(value)
+        return bytearray([dbus.Byte(c.encode()) for c in value])
+
+    def ReadValue(self, options):
+        value = self.get_value()
+        logger.debug("Drum count read: %s", value)
         return value
 
 
@@ -139,22 +345,22 @@ class DrumDescriptor(Descriptor):
         return bytearray(value)
 
 
-class FlowCharacteristic(Characteristic):
+class FlowCharacteristic(NotifyCharacteristic):
     FLOW_CHARACTERISTIC_UUID = "4190a0c9-dcea-400d-9017-926cfa3b3a9c"
-    def __init__(self, service):
-        self.notifying = False
-        self.flow = GetFlow()
-        Characteristic.__init__(
+    def __init__(self, service,flow,notify_interval=NOTIFY_TIMEOUT):
+        self.flow = flow
+        NotifyCharacteristic.__init__(
                 self, self.FLOW_CHARACTERISTIC_UUID,
-                ["notify", "read"], service)
+                ["notify", "read"], service, notify_interval)
         self.add_descriptor(FlowDescriptor(self))
 
+    def get_value(self):
+        value =str(self.flow.getflow())
+        return bytearray([dbus.Byte(c.encode()) for c in value])
 
     def ReadValue(self, options):
-
-        value =str(self.flow.getflow())
-        value = bytearray([dbus.Byte(c.encode()) for c in value])
-        print(value)
+        value = self.get_value()
+        logger.debug("Flow read: %s", value)
         return value
 
 
@@ -178,32 +384,251 @@ class FlowDescriptor(Descriptor):
         return bytearray(value)
 
 
-class TimeCharacteristic(Characteristic):
+class TelemetryCharacteristic(NotifyCharacteristic):
+    TELEMETRY_CHARACTERISTIC_UUID = "1c5a5e5e-4b7c-4919-a4fb-dddce685299e"
+
+    def __init__(self, service,recorder,notify_interval=NOTIFY_TIMEOUT):
+        self.recorder = recorder
+        NotifyCharacteristic.__init__(
+                self, self.TELEMETRY_CHARACTERISTIC_UUID,
+                ["notify", "read"], service, notify_interval)
+        self.add_descriptor(TelemetryDescriptor(self))
+
+    def get_value(self):
+        # One fixed-layout record replaces the RPM, drum and flow reads
+        return bytearray(pack_sample(self.recorder.latest()))
+
+
+class TelemetryDescriptor(Descriptor):
+    TELEMETRY_DESCRIPTOR_UUID = "2901"
+    TELEMETRY_DESCRIPTOR_VALUE = "Packed Mixer Telemetry"
+
+    def __init__(self, characteristic):
+        Descriptor.__init__(
+                self, self.TELEMETRY_DESCRIPTOR_UUID,
+                ["read"],
+                characteristic)
+
+    def ReadValue(self, options):
+        value = []
+        desc = self.TELEMETRY_DESCRIPTOR_VALUE
+
+        for c in desc:
+            value.append(dbus.Byte(c.encode()))
+
+        return bytearray(value)
+
+
+class SampleBatchCharacteristic(NotifyCharacteristic):
+    SAMPLE_BATCH_CHARACTERISTIC_UUID = "dd510a7f-0feb-4044-8c21-5ade94f96e83"
+
+    def __init__(self, service,recorder,max_samples,notify_interval,att_mtu=MIN_ATT_MTU):
+        self.recorder = recorder
+        self.max_samples = max_samples
+        # BlueZ truncates notifications to MTU - 3 and passes no MTU for them,
+        # so they are sized for the configured MTU every client is expected to have
+        self.per_notification = min(max_samples, samples_per_notification(att_mtu))
+        self.read_value = bytearray()
+        self.sent_seq = recorder.newest_seq()
+        NotifyCharacteristic.__init__(
+                self, self.SAMPLE_BATCH_CHARACTERISTIC_UUID,
+                ["notify", "read"], service, notify_interval)
+        self.add_descriptor(SampleBatchDescriptor(self))
+
+    def get_value(self):
+        newest = self.recorder.newest_seq()
+        return bytearray(pack_batch(self.recorder.since(newest - self.max_samples, self.max_samples)))
+
+    def ReadValue(self, options):
+        # Long reads continue at an offset: serve the rest of the same value
+        offset = int(options.get("offset", 0))
+        if offset == 0:
+            self.read_value = self.get_value()
+        return self.read_value[offset:]
+
+    def notify_value(self):
+        # Drain everything recorded since the last update, one notification at a time
+        count = max(1, self.per_notification)
+        samples = self.recorder.since(self.sent_seq, count)
+        while samples:
+            value = dbus.Array(pack_notification(samples, self.per_notification), signature='y')
+            self.PropertiesChanged(GATT_CHRC_IFACE, {"Value": value}, [])
+            self.sent_seq = samples[-1].seq
+            samples = self.recorder.since(self.sent_seq, count)
+
+    def StartNotify(self):
+        if not self.notifying:
+            self.sent_seq = self.recorder.newest_seq()
+        NotifyCharacteristic.StartNotify(self)
+
+
+class SampleBatchDescriptor(Descriptor):
+    SAMPLE_BATCH_DESCRIPTOR_UUID = "2901"
+    SAMPLE_BATCH_DESCRIPTOR_VALUE = "Batched Mixer Samples"
+
+    def __init__(self, characteristic):
+        Descriptor.__init__(
+                self, self.SAMPLE_BATCH_DESCRIPTOR_UUID,
+                ["read"],
+                characteristic)
+
+    def ReadValue(self, options):
+        value = []
+        desc = self.SAMPLE_BATCH_DESCRIPTOR_VALUE
+
+        for c in desc:
+            value.append(dbus.Byte(c.encode()))
+
+        return bytearray(value)
+
+
+class HistoryCharacteristic(NotifyCharacteristic):
+    HISTORY_CHARACTERISTIC_UUID = "4a9c680f-4ad0-4fbb-8885-4128070cd83b"
+    # oldest and newest sequence number available for backfill
+    RANGE_STRUCT = struct.Struct("<II")
+    CURSOR_STRUCT = struct.Struct("<I")
+
+    # Only batches go out as notifications, the range is for reads
+    notify_on_subscribe = False
+
+    def __init__(self, service):
+        self.cursor = None
+        self.stream_source = None
+        self.samples_per_message = 1
+        NotifyCharacteristic.__init__(
+                self, self.HISTORY_CHARACTERISTIC_UUID,
+                ["write", "read", "notify"], service, None)
+        self.add_descriptor(HistoryDescriptor(self))
+
+    def get_value(self):
+        store = self.service.store
+        return bytearray(self.RANGE_STRUCT.pack(store.oldest_seq(), self.service.recorder.newest_seq()))
+
+    def WriteValue(self, value, options):
+        # "Give me everything after sequence N"
+        if len(value) != self.CURSOR_STRUCT.size:
+            raise InvalidArgsException()
+
+        self.cursor, = self.CURSOR_STRUCT.unpack(bytes(value))
+        mtu = int(options.get("mtu", self.service.server_config["attMtu"]))
+        self.samples_per_message = samples_per_notification(mtu)
+        self.start_stream()
+
+    def start_stream(self):
+        if self.stream_source is None:
+            self.stream_source = self.add_timeout(HISTORY_NOTIFY_INTERVAL, self.stream_callback)
+
+    def StartNotify(self):
+        NotifyCharacteristic.StartNotify(self)
+        # The cursor may have been written before subscribing, resume from it
+        if self.cursor is not None:
+            self.start_stream()
+
+    def stream_callback(self):
+        samples = []
+        if self.notifying and self.cursor is not None:
+            samples = self.service.samples_since(self.cursor, max(1, self.samples_per_message))
+        if not samples:
+            self.stream_source = None
+            return False
+
+        value = dbus.Array(pack_notification(samples, self.samples_per_message), signature='y')
+        self.PropertiesChanged(GATT_CHRC_IFACE, {"Value": value}, [])
+        self.cursor = samples[-1].seq
+        return True
+
+
+class HistoryDescriptor(Descriptor):
+    HISTORY_DESCRIPTOR_UUID = "2901"
+    HISTORY_DESCRIPTOR_VALUE = "Sample History Backfill"
+
+    def __init__(self, characteristic):
+        Descriptor.__init__(
+                self, self.HISTORY_DESCRIPTOR_UUID,
+                ["read"],
+                characteristic)
+
+    def ReadValue(self, options):
+        value = []
+        desc = self.HISTORY_DESCRIPTOR_VALUE
+
+        for c in desc:
+            value.append(dbus.Byte(c.encode()))
+
+        return bytearray(value)
+
+
+class TimeCharacteristic(NotifyCharacteristic):
     UART_RX_CHARACTERISTIC_UUID ="784ab4cc-6f3f-42e1-9bbe-5d20619ee0f1"
+    DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
     def __init__(self,service):
-        Characteristic.__init__(self, self.UART_RX_CHARACTERISTIC_UUID,
-                                ['write'], service)
+        self.status = "idle"
+        self.in_flight = False
+        self.queued_time = None
+        NotifyCharacteristic.__init__(self, self.UART_RX_CHARACTERISTIC_UUID,
+                                      ['write', 'read', 'notify'], service, None)
         self.add_descriptor(TimeDescriptor(self))
 
+    def get_value(self):
+        return bytearray([dbus.Byte(c.encode()) for c in self.status])
+
+    def set_status(self, status):
+        self.status = status
+        if self.notifying:
+            self.notify_value()
+
     def WriteValue(self, value, options):
-        date_format = "%Y-%m-%d %H:%M:%S"
-        print('remote: {}'.format(bytearray(value).decode()))
+        new_time = bytearray(value).decode(errors="replace")
+        logger.debug("Time write: %s", new_time)
+        try:
+            requested = datetime.strptime(new_time, self.DATE_FORMAT).timestamp()
+        except ValueError as e:
+            self.set_status(f"error: {e}")
+            return
+
+        # A clock set is already running: keep only the newest request
+        if self.in_flight:
+            self.queued_time = new_time
+            return
+
+        if abs(requested - time.time()) < TIME_SYNC_TOLERANCE:
+            self.set_status("ok")
+            return
+
+        self.start_set_time(new_time)
+
+    def start_set_time(self, new_time):
+        self.in_flight = True
+        self.set_status("pending")
+        worker = threading.Thread(target=self.run_set_time, args=(new_time,),
+                                  name="time-sync", daemon=True)
+        worker.start()
+
+    def run_set_time(self, new_time):
+        command = ['sudo', 'date', '--set', new_time]
         try:
-            # Command to set the system date and time
-            new_time = bytearray(value).decode()
-            date_time_obj = datetime.strptime(new_time, date_format)
-            command = ['sudo', 'date', '--set', new_time]
-
-            # Execute the command
             result = subprocess.run(command, capture_output=True, text=True)
-
-            # Check for errors
             if result.returncode != 0:
-                print(f"Error setting date: {result.stderr}")
+                status = f"error: {result.stderr.strip()}"
             else:
-                print(f"Date set successfully: {new_time}")
+                status = "ok"
         except Exception as e:
-            print(f"An error occurred: {e}")
+            status = f"error: {e}"
+        # Report back on the main loop
+        GLib.idle_add(self.finish_set_time, new_time, status)
+
+    def finish_set_time(self, new_time, status):
+        logger.info(f"Date set to {new_time}: {status}")
+        self.in_flight = False
+        self.set_status(status)
+
+        queued_time, self.queued_time = self.queued_time, None
+        if queued_time is not None:
+            requested = datetime.strptime(queued_time, self.DATE_FORMAT).timestamp()
+            if abs(requested - time.time()) >= TIME_SYNC_TOLERANCE:
+                self.start_set_time(queued_time)
+        return False
             
             
 class TimeDescriptor(Descriptor):
@@ -230,21 +655,59 @@ class TimeDescriptor(Descriptor):
 class FileReceiveCharacteristic(Characteristic):
     FILE_RECEIVE_UUID = "1827a456-3f13-4bbf-ba10-dbb4ecc5d8fd"
 
-    def __init__(self, service):
+    def __init__(self, service, file_status):
+        self.file_status = file_status
         Characteristic.__init__(
             self, self.FILE_RECEIVE_UUID,
-            ["write"], service)
+            ["write", "write-without-response"], service)
         self.add_descriptor(FirmwareDescriptor(self))
 
     def WriteValue(self, value, options):
-        # Process received file data here
-        file_data = bytes(value)
+        # START/DATA/END/ABORT packets, see filetransfer.py for the layout
+        if self.file_status.transfer.handle(bytes(value)):
+            self.file_status.notify_status()
+
+
+class FileStatusCharacteristic(NotifyCharacteristic):
+    FILE_STATUS_UUID = "6a8f6b72-a691-4b98-a392-6b18090cbc25"
+
+    def __init__(self, service, transfer_config):
+        self.transfer = FileTransfer("iStrada.zip", transfer_config["ackInterval"],
+                                     transfer_config["maxSize"])
+        # Acks come from the transfer's syncer thread, notify from the main loop
+        self.transfer.when_acked = lambda: GLib.idle_add(self.notify_status)
+        NotifyCharacteristic.__init__(
+                self, self.FILE_STATUS_UUID,
+                ["notify", "read"], service, None)
+        self.add_descriptor(FileStatusDescriptor(self))
+
+    def get_value(self):
+        return bytearray(self.transfer.status())
+
+    def notify_status(self):
+        if self.notifying:
+            self.notify_value()
+        return False
+
+
+class FileStatusDescriptor(Descriptor):
+    FILE_STATUS_DESCRIPTOR_UUID = "2901"
+    FILE_STATUS_DESCRIPTOR_VALUE = "Firmware Upload Progress"
 
-        # Example: Save received file to a local file
-        with open("iStrada.zip", "wb") as file:
-            file.write(file_data)
+    def __init__(self, characteristic):
+        Descriptor.__init__(
+                self, self.FILE_STATUS_DESCRIPTOR_UUID,
+                ["read"],
+                characteristic)
 
-        print("Received file saved.")
+    def ReadValue(self, options):
+        value = []
+        desc = self.FILE_STATUS_DESCRIPTOR_VALUE
+
+        for c in desc:
+            value.append(dbus.Byte(c.encode()))
+
+        return bytearray(value)
 
         
 class FirmwareDescriptor(Descriptor):
@@ -267,17 +730,42 @@ class FirmwareDescriptor(Descriptor):
         return bytearray(value)
 
 
-app = Application()
-app.add_service(IstradaService(0))
-app.register()
-# 
-adv = IstradaAdvertisement(0)
-adv.register()
-# 
-try:
-    app.run()
-except KeyboardInterrupt:
-    app.quit()
+def main():
+    config = get_config()
+    logging_config = config["logging"]
+    setup_logging(level=logging_config["level"], max_files=logging_config["maxLogFiles"],
+                  max_bytes=logging_config["maxLogBytes"])
+
+    simulator = None
+    if config["simulation"]["enabled"]:
+        # No Pi or sensors needed: mock pins driven by synthetic pulse trains
+        import sensorsim
+        sensorsim.install()
+        simulator = sensorsim.from_config(config)
+
+    app = Application()
+    istrada_service = IstradaService(0)
+    if simulator is not None:
+        simulator.start()
+    app.add_service(istrada_service)
+    app.register()
+    # 
+    adv = IstradaAdvertisement(0, istrada_service.recorder, istrada_service.broadcast_config)
+    adv.register()
+    config.watch(config["serverInformation"]["configReloadInterval"])
+    # 
+    try:
+        app.run()
+    except KeyboardInterrupt:
+        app.quit()
+    finally:
+        istrada_service.checkpoint.close()
+        istrada_service.store.close()
+        istrada_service.file_status.transfer.close()
+
+
+if __name__ == "__main__":
+    main()
 
 
 # class BLEApplication(Application):
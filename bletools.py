@@ -28,30 +28,71 @@ except ImportError:
 BLUEZ_SERVICE_NAME = "org.bluez"
 LE_ADVERTISING_MANAGER_IFACE = "org.bluez.LEAdvertisingManager1"
 DBUS_OM_IFACE = "org.freedesktop.DBus.ObjectManager"
+ADAPTER_IFACE = "org.bluez.Adapter1"
 
 class BleTools(object):
+    # One system bus connection and adapter path shared by the whole process
+    bus = None
+    adapter = None
+    watching = False
+
     @classmethod
     def get_bus(self):
-         bus = dbus.SystemBus()
+        if self.bus is None:
+            self.bus = dbus.SystemBus()
 
-         return bus
+        return self.bus
 
     @classmethod
-    def find_adapter(self, bus):
+    def find_adapter(self, bus=None):
+        if bus is None:
+            bus = self.get_bus()
+
+        if self.adapter is not None and bus is self.bus:
+            return self.adapter
+
         remote_om = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, "/"),
                                DBUS_OM_IFACE)
         objects = remote_om.GetManagedObjects()
 
+        adapter = None
         for o, props in objects.items():
             if LE_ADVERTISING_MANAGER_IFACE in props:
-                return o
+                adapter = o
+                break
+
+        if bus is self.bus:
+            self.adapter = adapter
+            self.watch_adapters(bus)
+
+        return adapter
 
-        return None
+    @classmethod
+    def watch_adapters(self, bus):
+        if self.watching:
+            return
+
+        bus.add_signal_receiver(self.on_interfaces_changed,
+                                dbus_interface=DBUS_OM_IFACE,
+                                signal_name="InterfacesAdded",
+                                bus_name=BLUEZ_SERVICE_NAME)
+        bus.add_signal_receiver(self.on_interfaces_changed,
+                                dbus_interface=DBUS_OM_IFACE,
+                                signal_name="InterfacesRemoved",
+                                bus_name=BLUEZ_SERVICE_NAME)
+        self.watching = True
+
+    @classmethod
+    def on_interfaces_changed(self, path, interfaces):
+        # Device objects come and go on every scan, only adapters matter here
+        if LE_ADVERTISING_MANAGER_IFACE in interfaces or ADAPTER_IFACE in interfaces:
+            self.adapter = None
 
     @classmethod
     def power_adapter(self):
-        adapter = self.get_adapter()
+        bus = self.get_bus()
+        adapter = self.find_adapter(bus)
 
         adapter_props = dbus.Interface(bus.get_object(BLUEZ_SERVICE_NAME, adapter),
                 "org.freedesktop.DBus.Properties");
-        adapter_props.Set("org.bluez.Adapter1", "Powered", dbus.Boolean(1))
+        adapter_props.Set(ADAPTER_IFACE, "Powered", dbus.Boolean(1))
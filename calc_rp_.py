@@ -1,65 +1,262 @@
 
 from gpiozero import DigitalInputDevice,Button
+from collections import namedtuple, deque
+from array import array
+from bisect import bisect_left, insort
 import time
-import json
 import logging
+from appconfig import get_config
+from pulsetools import EdgeRing, PeriodicSampler, PulseCounter
+
+# Immutable result of one sampling period, swapped in atomically by the sampler
+RPMSnapshot = namedtuple("RPMSnapshot", ["rpm", "direction", "drum_cnt", "forward_cnt",
+                                         "reverse_cnt", "net_cnt", "timestamp"])
+
+
+class MovingAverageFilter:
+    def __init__(self, size):
+        self.size = size
+        self.values = array('d', [0.0]) * size
+        self.reset()
+
+    def reset(self):
+        self.index = 0
+        self.count = 0
+        self.total = 0.0
+
+    def update(self, value):
+        if self.count == self.size:
+            self.total -= self.values[self.index]
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        self.total += value
+        self.index = (self.index + 1) % self.size
+        return self.total / self.count
+
+
+class RollingMedianFilter:
+    # Window kept in a ring for eviction and a sorted list for the median
+    def __init__(self, size):
+        self.size = size
+        self.values = array('d', [0.0]) * size
+        self.reset()
+
+    def reset(self):
+        self.index = 0
+        self.count = 0
+        self.ordered = []
+
+    def update(self, value):
+        if self.count == self.size:
+            del self.ordered[bisect_left(self.ordered, self.values[self.index])]
+        else:
+            self.count += 1
+        self.values[self.index] = value
+        insort(self.ordered, value)
+        self.index = (self.index + 1) % self.size
+        return self.ordered[self.count // 2]
+
+
+class ExponentialFilter:
+    def __init__(self, size):
+        # Same centre of mass as a moving average over `size` samples
+        self.alpha = 2.0 / (size + 1)
+        self.reset()
+
+    def reset(self):
+        self.value = None
+
+    def update(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+# Keep appconfig.RPM_FILTER_KINDS in step with these names
+RPM_FILTERS = {
+    "moving_average": MovingAverageFilter,
+    "median": RollingMedianFilter,
+    "exponential": ExponentialFilter,
+}
+
+
+class RPMFilter:
+    """
+    Streaming smoother followed by a deadband: the output only moves when
+    the smoothed value differs from it by more than `tolerance` rpm. A raw
+    reading of exactly 0 (rotation stopped) resets the filter.
+    """
+    def __init__(self, kind="moving_average", size=10, tolerance=0.0):
+        self.filter = RPM_FILTERS[kind](size)
+        self.tolerance = tolerance
+        self.output = 0.0
+
+    def update(self, rpm):
+        if rpm == 0:
+            self.filter.reset()
+            self.output = 0.0
+            return self.output
+
+        smoothed = self.filter.update(rpm)
+        if abs(smoothed - self.output) > self.tolerance:
+            self.output = smoothed
+        return self.output
 
-logging.basicConfig(filename='/home/AnarPi/Desktop/ble_gatt/blestatus.log', level=logging.INFO, format='%(asctime)s - %(message)s')
 
 class RPMSensor:
-    def __init__(self):
+    def __init__(self, sample_period=1.0, config=None, batched=False):
         
         self.logger = logging.getLogger('BluetoothService')
-        self.filepath = "/home/AnarPi/Desktop/ble_gatt/Config.json"
-        self.pin_config = self.load_sensor_config()
-        self.rpmpin = self.pin_config["rpm_sensor"]["rpm_pin"]#24#controlOptions["rpmSensor_GPIO"]["rpmPin"]
-        self.hallpin = self.pin_config["hall_sensor"]["direction_pin"]#23 #controlOptions["hallSensor_GPIO"]["hallPin"]
+        self.config = config or get_config()
+        self.batched = batched
+        # Every rpm pulse is counted under the direction the drum had at that moment
+        self.forward_counter = PulseCounter()
+        self.reverse_counter = PulseCounter()
+        self.edges = EdgeRing(latency=self.config["ingestion"]["batchInterval"] if batched else 0.0)
+        # Recent (monotonic time, direction) changes, to tag batched edges after the fact
+        self.direction_changes = deque(maxlen=32)
+        self._open_devices(self.config.pins)
+        self.rpm_calibration = self.config.rpm_calibration
+        self.rpm_filter = RPMFilter(*self.rpm_calibration)
+        self.snapshot = self._make_snapshot(0)
+        self.sampler = PeriodicSampler(self._sample, sample_period, "rpm-sampler")
+
+    def _open_devices(self, pins):
+        self.rpmpin = pins.rpm_pin
+        self.hallpin = pins.hall_pin
+        self.hallsensor = Button(self.hallpin, pull_up=False,bounce_time=0.1)
+        self._set_direction(0 if self.hallsensor.is_pressed else 1)
+        self.hallsensor.when_pressed = self._set_reverse
+        self.hallsensor.when_released = self._set_forward
+        # In batched mode the rpm line belongs to an EdgeBatchReader feeding add_edges()
+        self.rpmsensor = None
+        if not self.batched:
+            self.rpmsensor = DigitalInputDevice(self.rpmpin, pull_up=False)
+            self.rpmsensor.when_activated = self._increment_count
+
+    def use_edge_callbacks(self):
+        # Batched ingestion failed: count rpm edges from gpiozero callbacks instead
+        self.batched = False
+        self.edges.latency = 0.0
         self.rpmsensor = DigitalInputDevice(self.rpmpin, pull_up=False)
         self.rpmsensor.when_activated = self._increment_count
-        self.hallsensor = Button(self.hallpin, pull_up=False,bounce_time=0.1)
-        self.drum_cnt = 0
-        self.direction =0
-        self.revolutions = 0
-        self.start_time = time.time()
-
-    def load_sensor_config(self):
-        with open(self.filepath, 'r') as file:
-            config = json.load(file)
-            self.logger.info(config)
-        return config['raspberrypi_sensors']
-        
+
+    def _close_devices(self):
+        if self.rpmsensor is not None:
+            self.rpmsensor.close()
+        self.hallsensor.close()
+
+    def apply_config(self, config):
+        # Live reload: pins and filter change, counters and edge history stay
+        self.config = config
+        pins = config.pins
+        if (pins.rpm_pin, pins.hall_pin) != (self.rpmpin, self.hallpin):
+            self._close_devices()
+            self._open_devices(pins)
+            self.logger.info(f"RPM sensors moved to pins {self.rpmpin} and {self.hallpin}")
+        if config.rpm_calibration != self.rpm_calibration:
+            # Built first, so a filter that fails leaves the old one and its calibration in place
+            self.rpm_filter = RPMFilter(*config.rpm_calibration)
+            self.rpm_calibration = config.rpm_calibration
+            self.logger.info(f"RPM filter set to {self.rpm_calibration}")
+
+    @property
+    def forward_cnt(self):
+        return self.forward_counter.total
+
+    @property
+    def reverse_cnt(self):
+        return self.reverse_counter.total
+
+    @property
+    def drum_cnt(self):
+        return self.forward_counter.total + self.reverse_counter.total
+
+    @property
+    def net_cnt(self):
+        return self.forward_counter.total - self.reverse_counter.total
+
+    def restore(self, forward, reverse):
+        # Totals from a previous run, added on top of anything counted since start-up
+        self.forward_counter.add(forward)
+        self.reverse_counter.add(reverse)
+        # Readers see the restored totals now, not at the next sampler tick
+        self.snapshot = self._make_snapshot(self.snapshot.rpm)
+
+    def _set_forward(self):
+        self._set_direction(1)
+
+    def _set_reverse(self):
+        self._set_direction(0)
+
+    def _set_direction(self, direction):
+        self.direction_changes.append((time.monotonic(), direction))
+        self.direction = direction
+
     def _increment_count(self):
-        self.revolutions += 1
-        self.drum_cnt +=1
+        self.edges.append(time.monotonic())
+        if self.direction:
+            self.forward_counter.increment()
+        else:
+            self.reverse_counter.increment()
+
+    def _direction_at(self, changes, timestamp):
+        for changed_at, direction in reversed(changes):
+            if changed_at <= timestamp:
+                return direction
+        return changes[0][1]
+
+    def add_edges(self, timestamps, missed=0):
+        self.edges.extend(timestamps)
+        changes = list(self.direction_changes)
+        if not timestamps or changes[-1][0] <= timestamps[0]:
+            # No reversal during this batch: one direction for all of it
+            forward = len(timestamps) if changes[-1][1] else 0
+        else:
+            forward = sum(self._direction_at(changes, timestamp) for timestamp in timestamps)
+        reverse = len(timestamps) - forward
+
+        # Dropped edges have no timestamp, count them with the current direction
+        if self.direction:
+            forward += missed
+        else:
+            reverse += missed
+        self.forward_counter.add(forward)
+        self.reverse_counter.add(reverse)
+
+    def _sample(self):
+        self.snapshot = self._compute_snapshot()
+
+    def _compute_snapshot(self):
+        # One pulse per revolution, estimated from the inter-pulse intervals
+        rpm = self.edges.rate(time.monotonic()) * 60
+        if self.direction==0:
+            rpm = -(rpm)
+        rpm = self.rpm_filter.update(rpm)
+
+        return self._make_snapshot(round(rpm))
+
+    def _make_snapshot(self, rpm):
+        forward = self.forward_counter.total
+        reverse = self.reverse_counter.total
+        return RPMSnapshot(rpm, self.direction, forward + reverse, forward, reverse,
+                           forward - reverse, time.time())
+
+    def get_snapshot(self):
+        return self.snapshot
+
+    def update_rpm(self):
+        # Kept for existing callers: a read-only view of the latest snapshot
+        snapshot = self.snapshot
+        return snapshot.rpm, snapshot.drum_cnt
 
-        
-    def update_rpm(self):       
-        while True:
-            try:
-                if self.hallsensor.is_pressed:
-                    self.direction=0
-
-                else:
-                    self.direction=1
- 
-                elapsed_time = time.time() - self.start_time
-
-                rpm = (self.revolutions / elapsed_time) * 60
-                self.revolutions = 0
-                self.start_time = time.time()
-                if self.direction==0:
-                    rpm = -(rpm)
-                else:
-                    rpm = rpm
-
-                return round(rpm), self.drum_cnt
-            except Exception as E:
-                self.logger.info(f"Error while try to calculate the RPM : {E}")
-                print(E)
-    
     def close(self):
-        self.sensor.close()
-        print(f"Sensor on pin {self.pin} closed.")
+        self.sampler.stop()
+        self._close_devices()
+        self.logger.info(f"Sensors on pins {self.rpmpin} and {self.hallpin} closed.")
 
 
 
@@ -0,0 +1,83 @@
+import logging
+import os
+import struct
+import threading
+import zlib
+
+CHECKPOINT_MAGIC = b"ISCK"
+# magic, generation, forward drum count, reverse drum count, flow pulses
+RECORD_STRUCT = struct.Struct("<4sIQQQ")
+SLOT_STRUCT = struct.Struct("<%dsI" % RECORD_STRUCT.size)
+
+
+class TotalsCheckpoint:
+    """
+    Job totals kept in two fixed slots of a small file, written alternately
+    with a crc32 and a generation number. A write torn by a power cut only
+    damages the older slot; load() takes the newest slot that checks out.
+    """
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self.logger = logging.getLogger('BluetoothService')
+        self.generation = 0
+        self.last_totals = None
+        self.source = None
+        self._stop_event = threading.Event()
+        self._thread = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+
+    def load(self):
+        """Returns (forward, reverse, flow_pulses), all zero without a valid checkpoint."""
+        best = None
+        for slot in range(2):
+            data = os.pread(self.fd, SLOT_STRUCT.size, slot * SLOT_STRUCT.size)
+            if len(data) != SLOT_STRUCT.size:
+                continue
+            payload, crc = SLOT_STRUCT.unpack(data)
+            if crc != zlib.crc32(payload):
+                continue
+            magic, generation, forward, reverse, flow_pulses = RECORD_STRUCT.unpack(payload)
+            if magic == CHECKPOINT_MAGIC and (best is None or generation > best[0]):
+                best = (generation, forward, reverse, flow_pulses)
+
+        if best is None:
+            return 0, 0, 0
+        self.generation = best[0]
+        self.last_totals = best[1:]
+        return self.last_totals
+
+    def save(self, totals):
+        if totals == self.last_totals:
+            return
+        self.generation += 1
+        payload = RECORD_STRUCT.pack(CHECKPOINT_MAGIC, self.generation & 0xFFFFFFFF, *totals)
+        os.pwrite(self.fd, SLOT_STRUCT.pack(payload, zlib.crc32(payload)),
+                  (self.generation % 2) * SLOT_STRUCT.size)
+        os.fdatasync(self.fd)
+        self.last_totals = totals
+
+    def start(self, source):
+        """Save source() at most once per interval, and only when it changed."""
+        self.source = source
+        self._thread = threading.Thread(target=self._run, name="checkpoint", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.save(self.source())
+            except OSError as e:
+                self.logger.info(f"Error while saving the totals checkpoint : {e}")
+
+    def close(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.source is not None:
+            self.save(self.source())
+        os.close(self.fd)
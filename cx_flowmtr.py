@@ -1,65 +1,137 @@
 
 from gpiozero import DigitalInputDevice
-from time import time, sleep
-import json
+from collections import namedtuple
+from time import time, sleep, monotonic
 import logging
+from appconfig import get_config
+from pulsetools import EdgeRing, PeriodicSampler, PulseCounter
+
+# Latest flow values, refreshed by the sampler thread and read without locking
+FlowSnapshot = namedtuple("FlowSnapshot", ["flow_rate_lpm", "total_liters", "over_limit", "timestamp"])
 
-logging.basicConfig(filename='/home/AnarPi/Desktop/ble_gatt/blestatus.log', level=logging.INFO, format='%(asctime)s - %(message)s')
 
 class GetFlow:
-    def __init__(self):
+    def __init__(self, sample_period=0.5, rate_window=5.0, config=None, batched=False):
         self.logger = logging.getLogger('BluetoothService')
-        self.filepath = "/home/AnarPi/Desktop/ble_gatt/Config.json"
-        self.pin_config = self.load_sensor_config()
-        self.FLOW_METER_PIN = self.pin_config["water_meter"]["flow_pin"]#13#controlOptions["waterMeter_GPIO"]["inputPin"]
-        self.max_flow_rate_lpm = 190  # max flow rate in liters per minute
+        self.config = config or get_config()
+        self.batched = batched
+        self.FLOW_METER_PIN = self.config.pins.flow_pin
+        calibration = self.config.flow_calibration
+        self.max_flow_rate_lpm = calibration.max_flow_rate_lpm  # max flow rate in liters per minute
         self.max_pressure_psi = 200  # max pressure in pounds per square inch
         
         # Flow meter pulses per gallon
-        self.pulses_per_gallon = 100
-        self.total_pulses = 0
+        self.pulses_per_gallon = calibration.pulses_per_gallon
+        self.pulse_counter = PulseCounter()
         self.start_time = time()
         self.flow_rate_gpm = 0
         self.flow_rate_lpm = 0
         self.gpm_to_lpm = 3.785
+        self.total_flow_liters = 0
+        self.over_limit = False
+        # Called with (over_limit, flow_rate_lpm) when the rate crosses max_flow_rate_lpm
+        self.when_over_limit = None
+        self.snapshot = FlowSnapshot(0, 0, False, self.start_time)
+
+        self.rate_window = rate_window
+        # Batched edges reach the ring up to one batch interval late
+        self.edge_latency = self.config["ingestion"]["batchInterval"] if batched else 0.0
+        self.edges = EdgeRing(self._edge_capacity(), self.edge_latency)
         
-        # Initialize the flow meter sensor
-        self.sensor = DigitalInputDevice(self.FLOW_METER_PIN, pull_up=False)
-        self.sensor.when_activated = self.pulse_callback
-    
-    def load_sensor_config(self):
-        with open(self.filepath, 'r') as file:
-            config = json.load(file)
-            self.logger.info(config)
-        return config['raspberrypi_sensors']
-        
+        # Initialize the flow meter sensor, unless an EdgeBatchReader feeds add_edges()
+        self.sensor = None
+        self._open_sensor()
+
+        self.sampler = PeriodicSampler(self.update_flow, sample_period, "flow-sampler")
+
+    def _edge_capacity(self):
+        # Enough pulse timestamps to cover rate_window at the maximum flow rate
+        max_pulses_per_second = self.max_flow_rate_lpm / self.gpm_to_lpm * self.pulses_per_gallon / 60
+        return int(max_pulses_per_second * self.rate_window * 1.5) + 2
+
+    def _open_sensor(self):
+        if not self.batched:
+            self.sensor = DigitalInputDevice(self.FLOW_METER_PIN, pull_up=False)
+            self.sensor.when_activated = self.pulse_callback
+
+    def use_edge_callbacks(self):
+        # Batched ingestion failed: count flow edges from gpiozero callbacks instead
+        self.batched = False
+        self.edge_latency = self.edges.latency = 0.0
+        self._open_sensor()
+
+    def apply_config(self, config):
+        # Live reload: pin and calibration change, the totalizer keeps counting
+        self.config = config
+        if config.pins.flow_pin != self.FLOW_METER_PIN:
+            if self.sensor is not None:
+                self.sensor.close()
+            self.FLOW_METER_PIN = config.pins.flow_pin
+            self._open_sensor()
+            self.logger.info(f"Flow meter moved to pin {self.FLOW_METER_PIN}")
+
+        calibration = config.flow_calibration
+        if calibration != (self.pulses_per_gallon, self.max_flow_rate_lpm):
+            self.pulses_per_gallon, self.max_flow_rate_lpm = calibration
+            capacity = self._edge_capacity()
+            if capacity != self.edges.capacity:
+                self.edges = EdgeRing(capacity, self.edge_latency)
+            self.logger.info(f"Flow meter calibration set to {calibration}")
+
+    @property
+    def total_pulses(self):
+        return self.pulse_counter.total
+
+    def restore(self, pulses):
+        # Totalizer from a previous run, added on top of anything counted since start-up
+        self.pulse_counter.add(pulses)
+        # Readers see the restored total now, not at the next sampler tick
+        self.total_flow_liters = (self.total_pulses / self.pulses_per_gallon) * self.gpm_to_lpm
+        self.snapshot = self.snapshot._replace(total_liters=self.total_flow_liters)
+
     def pulse_callback(self):
-        self.total_pulses += 1
+        self.edges.append(monotonic())
+        self.pulse_counter.increment()
 
-    def getflow(self):
+    def add_edges(self, timestamps, missed=0):
+        self.edges.extend(timestamps)
+        self.pulse_counter.add(len(timestamps) + missed)
+
+    def update_flow(self):
         try:
-            self.elapsed_time = time() - self.start_time
-            if self.elapsed_time > 0:
-                self.flow_rate_gpm = (self.total_pulses / self.pulses_per_gallon) / (self.elapsed_time / 60)
-                self.flow_rate_lpm = self.flow_rate_gpm * self.gpm_to_lpm
-                self.total_flow_liters = (self.total_pulses / self.pulses_per_gallon) * 3.785
-
-#                 if self.flow_rate_lpm > self.max_flow_rate_lpm:
-#                     print("Warning: Flow rate exceeds the maximum limit")
-# 
-#                 print(f"Flow Rate: {self.flow_rate_lpm:.2f} LPM, Total Flow: {self.total_flow_liters:.2f} Liters")
-#                 print(f"Maximum Flow Rate: {self.max_flow_rate_lpm} LPM, Maximum Pressure: {self.max_pressure_psi} PSI")
-#             
-            sleep(0.5)
-            return int(round(self.total_flow_liters))
+            # Instantaneous rate over the last rate_window seconds of pulses
+            pulses_per_second = self.edges.rate(monotonic(), self.edges.capacity - 1,
+                                                self.rate_window, self.rate_window)
+            self.flow_rate_gpm = pulses_per_second * 60 / self.pulses_per_gallon
+            self.flow_rate_lpm = self.flow_rate_gpm * self.gpm_to_lpm
+            self.total_flow_liters = (self.total_pulses / self.pulses_per_gallon) * self.gpm_to_lpm
+
+            over_limit = self.flow_rate_lpm > self.max_flow_rate_lpm
+            if over_limit != self.over_limit:
+                self.over_limit = over_limit
+                if self.when_over_limit is not None:
+                    self.when_over_limit(over_limit, self.flow_rate_lpm)
+
+            self.snapshot = FlowSnapshot(self.flow_rate_lpm, self.total_flow_liters, over_limit, time())
         except Exception as e:
             self.logger.info(f"Error while try to calculate the waterflow : {e}")
 
-            print(f"Error while running the code: {e}")
+    def get_snapshot(self):
+        return self.snapshot
+
+    def getflow(self):
+        # Served from the cache so D-Bus handlers never wait on the sensor
+        return int(round(self.snapshot.total_liters))
+
+    def close(self):
+        self.sampler.stop()
+        if self.sensor is not None:
+            self.sensor.close()
 
 if __name__ == "__main__":
+    from logsetup import setup_logging
+    setup_logging()
     chk_flow = GetFlow()
     while True:
-        chk_flow.getflow()
-
-
+        sleep(0.5)
+        print(chk_flow.getflow())
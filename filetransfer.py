@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+
+OP_START = 0x01
+OP_DATA = 0x02
+OP_END = 0x03
+OP_ABORT = 0x04
+
+# opcode, total size, sha256 of the whole file
+START_STRUCT = struct.Struct("<BI32s")
+# opcode, offset of the payload that follows
+DATA_HEADER_STRUCT = struct.Struct("<BI")
+# state, error, acknowledged offset, total size
+STATUS_STRUCT = struct.Struct("<BBII")
+
+STATE_IDLE = 0
+STATE_RECEIVING = 1
+STATE_COMPLETE = 2
+STATE_ERROR = 3
+
+ERROR_NONE = 0
+ERROR_BAD_REQUEST = 1
+ERROR_OFFSET = 2
+ERROR_HASH = 3
+ERROR_IO = 4
+
+
+class FileTransfer:
+    """
+    Offset-addressed upload into a preallocated staging file of at most
+    `max_size` bytes. Every `ack_interval` bytes a syncer thread flushes the
+    staging file and checkpoints the acked offset to a small metadata file,
+    so a START with the same size and hash resumes from there. It calls
+    when_acked() from that thread once the acked offset has moved.
+    """
+    def __init__(self, target_path, ack_interval=16384, max_size=32 * 1024 * 1024):
+        self.target_path = target_path
+        self.staging_path = target_path + ".part"
+        self.meta_path = target_path + ".meta"
+        self.ack_interval = ack_interval
+        self.max_size = max_size
+        self.when_acked = None
+        # Held while the fd or the checkpoint change hands between threads
+        self._lock = threading.RLock()
+        self._sync_wanted = threading.Event()
+        self._stop_event = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop, name="upload-sync", daemon=True)
+        self._syncer.start()
+        self.fd = None
+        self.size = 0
+        self.digest = b""
+        self.offset = 0
+        self.acked_offset = 0
+        self.state = STATE_IDLE
+        self.error = ERROR_NONE
+
+    def status(self):
+        return STATUS_STRUCT.pack(self.state, self.error, self.acked_offset, self.size)
+
+    def handle(self, value):
+        """Process one write. Returns True when the status has changed."""
+        if not value:
+            return self._fail(ERROR_BAD_REQUEST)
+
+        try:
+            opcode = value[0]
+            if opcode == OP_DATA and len(value) > DATA_HEADER_STRUCT.size:
+                _, offset = DATA_HEADER_STRUCT.unpack_from(value)
+                return self.write_chunk(offset, value[DATA_HEADER_STRUCT.size:])
+            if opcode == OP_START and len(value) == START_STRUCT.size:
+                _, size, digest = START_STRUCT.unpack(value)
+                return self.start(size, digest)
+            if opcode == OP_END:
+                return self.finish()
+            if opcode == OP_ABORT:
+                return self.abort()
+        except OSError:
+            self._close()
+            return self._fail(ERROR_IO)
+
+        return self._fail(ERROR_BAD_REQUEST)
+
+    def start(self, size, digest):
+        if size > self.max_size:
+            return self._fail(ERROR_BAD_REQUEST)
+
+        with self._lock:
+            self._close()
+            meta = self._load_meta()
+            resume = (meta is not None and meta["size"] == size and meta["sha256"] == digest.hex()
+                      and os.path.exists(self.staging_path))
+
+            self.fd = os.open(self.staging_path, os.O_RDWR | os.O_CREAT, 0o644)
+            if resume:
+                self.acked_offset = meta["offset"]
+            else:
+                os.ftruncate(self.fd, size)
+                if hasattr(os, "posix_fallocate") and size > 0:
+                    os.posix_fallocate(self.fd, 0, size)
+                self.acked_offset = 0
+
+            self.size = size
+            self.digest = digest
+            self.offset = self.acked_offset
+            self.state = STATE_RECEIVING
+            self.error = ERROR_NONE
+            self._save_meta()
+            return True
+
+    def write_chunk(self, offset, data):
+        if self.state != STATE_RECEIVING:
+            return self._fail(ERROR_BAD_REQUEST)
+        # The syncer may have acked past a rewound write position
+        if not self.acked_offset <= offset <= max(self.offset, self.acked_offset) \
+                or offset + len(data) > self.size:
+            # Tell the client where to continue from
+            self.error = ERROR_OFFSET
+            return True
+
+        # A rewind to anywhere after the acked offset resends what may have been lost
+        os.pwrite(self.fd, data, offset)
+        self.offset = offset + len(data)
+        if self.error != ERROR_NONE:
+            self.error = ERROR_NONE
+        if self.offset - self.acked_offset >= self.ack_interval or self.offset == self.size:
+            # Acked (and the status notified) once the syncer has flushed it
+            self._sync_wanted.set()
+        return False
+
+    def finish(self):
+        if self.state != STATE_RECEIVING:
+            return self._fail(ERROR_BAD_REQUEST)
+
+        with self._lock:
+            self._checkpoint()
+        self._close()
+        if self.offset != self.size or self._hash_staging() != self.digest:
+            self._remove(self.meta_path)
+            self.offset = self.acked_offset = 0
+            return self._fail(ERROR_HASH)
+
+        os.replace(self.staging_path, self.target_path)
+        self._remove(self.meta_path)
+        self.state = STATE_COMPLETE
+        self.error = ERROR_NONE
+        return True
+
+    def abort(self):
+        with self._lock:
+            self._close()
+            self._remove(self.staging_path)
+            self._remove(self.meta_path)
+            self.size = self.offset = self.acked_offset = 0
+            self.state = STATE_IDLE
+            self.error = ERROR_NONE
+            return True
+
+    def _sync_loop(self):
+        while True:
+            self._sync_wanted.wait()
+            self._sync_wanted.clear()
+            if self._stop_event.is_set():
+                return
+            with self._lock:
+                if self.fd is None or self.state != STATE_RECEIVING:
+                    continue
+                try:
+                    acked = self._checkpoint()
+                except OSError:
+                    acked = False
+            if acked and self.when_acked is not None:
+                self.when_acked()
+
+    def _checkpoint(self):
+        # Everything below the offset read here was written before the sync
+        offset = self.offset
+        if offset <= self.acked_offset:
+            return False
+        os.fdatasync(self.fd)
+        self.acked_offset = offset
+        self._save_meta()
+        return True
+
+    def close(self):
+        self._stop_event.set()
+        self._sync_wanted.set()
+        self._syncer.join()
+        self._close()
+
+    def _hash_staging(self):
+        sha = hashlib.sha256()
+        with open(self.staging_path, "rb") as file:
+            for block in iter(lambda: file.read(65536), b""):
+                sha.update(block)
+        return sha.digest()
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def _save_meta(self):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w") as file:
+            json.dump({"size": self.size, "sha256": self.digest.hex(),
+                       "offset": self.acked_offset}, file)
+        os.replace(tmp_path, self.meta_path)
+
+    def _fail(self, error):
+        self.state = STATE_ERROR
+        self.error = error
+        return True
+
+    def _close(self):
+        with self._lock:
+            if self.fd is not None:
+                os.close(self.fd)
+                self.fd = None
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,40 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+
+LOG_PATH = '/home/AnarPi/Desktop/ble_gatt/blestatus.log'
+LOG_FORMAT = '%(asctime)s - %(message)s'
+
+_listener = None
+
+
+def setup_logging(path=LOG_PATH, level="INFO", max_files=20, max_bytes=1048576):
+    """
+    Route every logger through a queue to one rotating file handler running
+    on a writer thread, so callers (the D-Bus main loop, gpiozero callback
+    threads) never wait on the SD card.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    file_handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes,
+                                                        backupCount=max_files)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
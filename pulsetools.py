@@ -0,0 +1,210 @@
+from array import array
+from datetime import timedelta
+import logging
+import threading
+
+try:
+    import gpiod
+    from gpiod.line import Bias, Edge
+except ImportError:
+    gpiod = None
+
+
+class PulseCounter:
+    """
+    Pulse total shared between the edge callback and edge reader threads.
+    Writers update it under a lock. The total is never reset, so readers
+    take it as is and work with differences between readings.
+    """
+    def __init__(self, total=0):
+        self._lock = threading.Lock()
+        self.total = total
+
+    def increment(self):
+        with self._lock:
+            self.total += 1
+
+    def add(self, count):
+        with self._lock:
+            self.total += count
+
+
+class EdgeRing:
+    """
+    Preallocated ring buffer of edge timestamps (time.monotonic() seconds).
+    A single callback thread appends, readers only look at the newest entries.
+    `latency` is how late edges can arrive (the batch interval when they come
+    from an EdgeBatchReader, 0 for live callbacks).
+    """
+    def __init__(self, capacity=64, latency=0.0):
+        self.capacity = capacity
+        self.latency = latency
+        self.times = array('d', [0.0]) * capacity
+        self.index = 0
+        self.count = 0
+
+    def append(self, timestamp):
+        self.times[self.index] = timestamp
+        self.index = (self.index + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def extend(self, timestamps):
+        for timestamp in timestamps:
+            self.times[self.index] = timestamp
+            self.index = (self.index + 1) % self.capacity
+        self.count = min(self.capacity, self.count + len(timestamps))
+
+    def last(self):
+        if self.count == 0:
+            return None
+        return self.times[self.index - 1]
+
+    def rate(self, now, max_intervals=8, window=10.0, timeout=60.0):
+        """
+        Pulses per second estimated from the most recent inter-pulse
+        intervals. Returns 0 before two pulses or after `timeout` seconds
+        without one; while waiting for the next pulse the elapsed time since
+        the last one bounds the estimate so it decays when rotation stops.
+        Only time past `latency` counts, younger edges may not be here yet.
+        """
+        index = self.index
+        count = self.count
+        if count < 2:
+            return 0.0
+
+        last = self.times[index - 1]
+        since_last = now - last
+        if since_last > timeout:
+            return 0.0
+
+        intervals = 1
+        first = self.times[index - 2]
+        while intervals < min(count - 1, max_intervals):
+            candidate = self.times[index - 2 - intervals]
+            if last - candidate > window:
+                break
+            first = candidate
+            intervals += 1
+
+        period = (last - first) / intervals
+        silent = since_last - self.latency
+        if silent > period:
+            period = silent
+        if period <= 0:
+            return 0.0
+        return 1.0 / period
+
+
+class PeriodicSampler:
+    """
+    Calls sample() on its own thread every `period` seconds. set_period()
+    takes effect immediately, with a fresh sample. Errors from sample() are
+    logged and the next period tries again.
+    """
+    def __init__(self, sample, period, name):
+        self.sample = sample
+        self.period = period
+        self.name = name
+        self.logger = logging.getLogger('BluetoothService')
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self._wake_event.wait(self.period)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                break
+            try:
+                self.sample()
+            except Exception as e:
+                self.logger.info(f"Error in the {self.name} : {e}")
+
+    def set_period(self, period):
+        self.period = period
+        self._wake_event.set()
+
+    def stop(self):
+        self._stop_event.set()
+        self._wake_event.set()
+        self._thread.join()
+
+
+class EdgeBatchReader:
+    """
+    Rising-edge ingestion through the libgpiod v2 character device. The
+    kernel timestamps and queues edges (CLOCK_MONOTONIC, same as
+    time.monotonic()), and a reader thread drains the queue once per
+    `batch_interval`, calling handlers[offset](timestamps, missed) with an
+    array('d') per line. `missed` counts edges the kernel queue dropped,
+    taken from gaps in the per-line sequence numbers. If the lines cannot be
+    requested or read, the error is logged and when_failed(error) is called
+    from the reader thread.
+    """
+    def __init__(self, chip_path, handlers, batch_interval=0.05, buffer_size=1024):
+        self.chip_path = chip_path
+        self.handlers = handlers
+        self.batch_interval = batch_interval
+        self.buffer_size = buffer_size
+        self.logger = logging.getLogger('BluetoothService')
+        self.last_seqno = {}
+        self.when_failed = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def available():
+        return gpiod is not None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="edge-reader", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        try:
+            self._read_edges()
+        except Exception as e:
+            self.logger.error(f"Edge reader on {self.chip_path} stopped : {e}")
+            if self.when_failed is not None:
+                self.when_failed(e)
+
+    def _read_edges(self):
+        settings = gpiod.LineSettings(edge_detection=Edge.RISING, bias=Bias.PULL_DOWN)
+        with gpiod.request_lines(self.chip_path, consumer="istrada-ble",
+                                 config={tuple(self.handlers): settings},
+                                 event_buffer_size=self.buffer_size) as request:
+            while not self._stop_event.is_set():
+                if request.wait_edge_events(timedelta(seconds=0.5)):
+                    self._dispatch(request.read_edge_events(self.buffer_size))
+                # Let the kernel collect the next batch
+                self._stop_event.wait(self.batch_interval)
+
+    def _dispatch(self, events):
+        batches = {}
+        missed = {}
+        for event in events:
+            offset = event.line_offset
+            timestamps = batches.get(offset)
+            if timestamps is None:
+                timestamps = batches[offset] = array('d')
+                missed[offset] = 0
+            last_seqno = self.last_seqno.get(offset)
+            if last_seqno is not None and event.line_seqno > last_seqno + 1:
+                missed[offset] += event.line_seqno - last_seqno - 1
+            self.last_seqno[offset] = event.line_seqno
+            timestamps.append(event.timestamp_ns / 1e9)
+
+        for offset, timestamps in batches.items():
+            try:
+                self.handlers[offset](timestamps, missed[offset])
+            except Exception as e:
+                self.logger.info(f"Error while handling edges on line {offset} : {e}")
@@ -0,0 +1,120 @@
+import mmap
+import os
+import logging
+import struct
+import threading
+import zlib
+
+from telemetry import TELEMETRY_STRUCT, pack_sample, unpack_sample
+
+STORE_MAGIC = b"ISTS"
+STORE_VERSION = 2
+# magic, version, record size, capacity
+HEADER_STRUCT = struct.Struct("<4sHHI")
+# packed telemetry sample followed by its crc32
+RECORD_STRUCT = struct.Struct("<%dsI" % TELEMETRY_STRUCT.size)
+
+
+class SampleStore:
+    """
+    Fixed-size ring of telemetry records on disk. Sample `seq` lives in slot
+    (seq - 1) % capacity, every record carries a crc32 so a write torn by a
+    power cut is simply skipped, and fsyncs are batched every `sync_interval`
+    seconds on a syncer thread, so append() never waits on the card.
+    """
+    def __init__(self, folder, capacity, sync_interval, filename="telemetry.bin"):
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, filename)
+        self.capacity = capacity
+        self.sync_interval = sync_interval
+        self.file_size = HEADER_STRUCT.size + capacity * RECORD_STRUCT.size
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if not self._header_valid():
+            self._format()
+        self.map = mmap.mmap(self.fd, self.file_size, access=mmap.ACCESS_READ)
+        self.last_seq = self._scan_last_seq()
+        self.logger = logging.getLogger('BluetoothService')
+        self.dirty = False
+        self._stop_event = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop, name="store-sync", daemon=True)
+        self._syncer.start()
+
+    def _header_valid(self):
+        if os.fstat(self.fd).st_size != self.file_size:
+            return False
+        header = os.pread(self.fd, HEADER_STRUCT.size, 0)
+        return header == HEADER_STRUCT.pack(STORE_MAGIC, STORE_VERSION, RECORD_STRUCT.size, self.capacity)
+
+    def _format(self):
+        os.ftruncate(self.fd, 0)
+        os.ftruncate(self.fd, self.file_size)
+        os.pwrite(self.fd, HEADER_STRUCT.pack(STORE_MAGIC, STORE_VERSION, RECORD_STRUCT.size, self.capacity), 0)
+        os.fsync(self.fd)
+
+    def _offset(self, seq):
+        return HEADER_STRUCT.size + ((seq - 1) % self.capacity) * RECORD_STRUCT.size
+
+    def _read_slot(self, offset):
+        payload, crc = RECORD_STRUCT.unpack_from(self.map, offset)
+        if crc != zlib.crc32(payload) or not any(payload):
+            return None
+        try:
+            return unpack_sample(payload)
+        except ValueError:
+            return None
+
+    def _scan_last_seq(self):
+        last_seq = 0
+        for slot in range(self.capacity):
+            sample = self._read_slot(HEADER_STRUCT.size + slot * RECORD_STRUCT.size)
+            if sample is not None and sample.seq > last_seq:
+                last_seq = sample.seq
+        return last_seq
+
+    def append(self, sample):
+        payload = pack_sample(sample)
+        os.pwrite(self.fd, RECORD_STRUCT.pack(payload, zlib.crc32(payload)), self._offset(sample.seq))
+        self.last_seq = sample.seq
+        self.dirty = True
+
+    def _sync_loop(self):
+        while not self._stop_event.wait(self.sync_interval):
+            try:
+                self.sync()
+            except OSError as e:
+                self.logger.info(f"Error while syncing the sample store : {e}")
+
+    def sync(self):
+        if self.dirty:
+            # Cleared first: an append during the sync marks it dirty again
+            self.dirty = False
+            os.fdatasync(self.fd)
+
+    def oldest_seq(self):
+        return max(1, self.last_seq - self.capacity + 1)
+
+    def get(self, seq):
+        if seq < self.oldest_seq() or seq > self.last_seq:
+            return None
+        sample = self._read_slot(self._offset(seq))
+        if sample is None or sample.seq != seq:
+            return None
+        return sample
+
+    def since(self, seq, limit):
+        """Up to `limit` stored samples with a sequence number greater than `seq`."""
+        samples = []
+        seq = max(seq + 1, self.oldest_seq())
+        while seq <= self.last_seq and len(samples) < limit:
+            sample = self.get(seq)
+            if sample is not None:
+                samples.append(sample)
+            seq += 1
+        return samples
+
+    def close(self):
+        self._stop_event.set()
+        self._syncer.join()
+        self.sync()
+        self.map.close()
+        os.close(self.fd)
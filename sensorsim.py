@@ -0,0 +1,120 @@
+import threading
+import time
+
+from gpiozero import Device
+from gpiozero.pins.mock import MockFactory
+
+GPM_TO_LPM = 3.785
+
+
+def constant(value):
+    return lambda t: value
+
+
+def ramp(start, end, duration):
+    return lambda t: start + (end - start) * min(t / duration, 1.0)
+
+
+def reversing(rpm, period):
+    return lambda t: rpm if int(t // period) % 2 == 0 else -rpm
+
+
+def bursts(rate, on_time, off_time):
+    return lambda t: rate if t % (on_time + off_time) < on_time else 0
+
+
+PROFILES = {
+    "constant": lambda spec: constant(spec["value"]),
+    "ramp": lambda spec: ramp(spec["start"], spec["end"], spec["duration"]),
+    "reversing": lambda spec: reversing(spec["value"], spec["period"]),
+    "bursts": lambda spec: bursts(spec["value"], spec["on_time"], spec["off_time"]),
+}
+
+
+def make_profile(spec):
+    return PROFILES[spec["type"]](spec)
+
+
+def install():
+    """Swap gpiozero to mock pins. Must run before any sensor is created."""
+    Device.pin_factory = MockFactory()
+    return Device.pin_factory
+
+
+class SensorSimulator:
+    """
+    Drives the rpm, hall and flow pins of a MockFactory with pulse trains.
+    rpm_profile(t) returns a signed drum speed (negative drives the hall pin
+    high, which RPMSensor reads as reverse), flow_profile(t) a rate in L/min,
+    turned into pulses with the same FlowCalibration GetFlow uses.
+    `bounce` adds that many spurious toggles to every rising edge.
+    """
+    def __init__(self, pins, flow_calibration, rpm_profile, flow_profile, bounce=0, bounce_time=0.0005):
+        factory = Device.pin_factory
+        self.rpm_pin = factory.pin(pins.rpm_pin)
+        self.hall_pin = factory.pin(pins.hall_pin)
+        self.flow_pin = factory.pin(pins.flow_pin)
+        self.flow_calibration = flow_calibration
+        self.rpm_profile = rpm_profile
+        self.flow_profile = flow_profile
+        self.bounce = bounce
+        self.bounce_time = bounce_time
+        self.rpm_pulses = 0
+        self.flow_pulses = 0
+        self._stop_event = threading.Event()
+        self._threads = []
+
+    def start(self):
+        self.start_time = time.monotonic()
+        for target, name in ((self._run_rpm, "sim-rpm"), (self._run_flow, "sim-flow")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _pulse(self, pin):
+        pin.drive_high()
+        for _ in range(self.bounce):
+            time.sleep(self.bounce_time)
+            pin.drive_low()
+            time.sleep(self.bounce_time)
+            pin.drive_high()
+        pin.drive_low()
+
+    def _run_rpm(self):
+        while not self._stop_event.is_set():
+            rpm = self.rpm_profile(time.monotonic() - self.start_time)
+            if rpm < 0:
+                self.hall_pin.drive_high()
+            else:
+                self.hall_pin.drive_low()
+            if rpm == 0:
+                self._stop_event.wait(0.1)
+                continue
+            self._pulse(self.rpm_pin)
+            self.rpm_pulses += 1
+            self._stop_event.wait(60.0 / abs(rpm))
+
+    def _run_flow(self):
+        while not self._stop_event.is_set():
+            rate_lpm = self.flow_profile(time.monotonic() - self.start_time)
+            if rate_lpm <= 0:
+                self._stop_event.wait(0.1)
+                continue
+            self._pulse(self.flow_pin)
+            self.flow_pulses += 1
+            pulses_per_second = rate_lpm / GPM_TO_LPM * self.flow_calibration.pulses_per_gallon / 60
+            self._stop_event.wait(1.0 / pulses_per_second)
+
+
+def from_config(config):
+    sim_config = config["simulation"]
+    return SensorSimulator(config.pins, config.flow_calibration,
+                           make_profile(sim_config["rpm_profile"]),
+                           make_profile(sim_config["flow_profile"]),
+                           sim_config["bounce"])
@@ -53,16 +53,30 @@ class Application(dbus.service.Object):
         self.path = "/"
         self.services = []
         self.next_index = 0
+        self.managed_objects = None
         dbus.service.Object.__init__(self, self.bus, self.path)
 
     def get_path(self):
         return dbus.ObjectPath(self.path)
 
     def add_service(self, service):
+        service.application = self
         self.services.append(service)
+        self.invalidate()
+
+    def invalidate(self):
+        self.managed_objects = None
 
     @dbus.service.method(DBUS_OM_IFACE, out_signature = "a{oa{sa{sv}}}")
     def GetManagedObjects(self):
+        # The object tree only changes when something is added, so the
+        # marshalled response is built once and reused until invalidated
+        if self.managed_objects is None:
+            self.managed_objects = self.build_managed_objects()
+
+        return self.managed_objects
+
+    def build_managed_objects(self):
         response = {}
 
         for service in self.services:
@@ -83,6 +97,7 @@ class Application(dbus.service.Object):
         print("Failed to register application: " + str(error))
 
     def register(self):
+        self.GetManagedObjects()
         adapter = BleTools.find_adapter(self.bus)
 
         service_manager = dbus.Interface(
@@ -110,6 +125,7 @@ class Service(dbus.service.Object):
         self.primary = primary
         self.characteristics = []
         self.next_index = 0
+        self.application = None
         dbus.service.Object.__init__(self, self.bus, self.path)
 
     def get_properties(self):
@@ -128,6 +144,14 @@ class Service(dbus.service.Object):
 
     def add_characteristic(self, characteristic):
         self.characteristics.append(characteristic)
+        self.invalidate()
+
+    def invalidate(self):
+        if self.application is not None:
+            self.application.invalidate()
+
+    def subscription_changed(self, characteristic):
+        pass
 
     def get_characteristic_paths(self):
         result = []
@@ -188,6 +212,7 @@ class Characteristic(dbus.service.Object):
 
     def add_descriptor(self, descriptor):
         self.descriptors.append(descriptor)
+        self.service.invalidate()
 
     def get_descriptor_paths(self):
         result = []
@@ -246,7 +271,79 @@ class Characteristic(dbus.service.Object):
         return idx
 
     def add_timeout(self, timeout, callback):
-        GObject.timeout_add(timeout, callback)
+        return GObject.timeout_add(timeout, callback)
+
+    def remove_timeout(self, source_id):
+        GObject.source_remove(source_id)
+
+
+class NotifyCharacteristic(Characteristic):
+    """
+    Characteristic that pushes its value with PropertiesChanged on a timer
+    while at least one client is subscribed. Subclasses implement get_value().
+    With a notify_interval of None values are only pushed via notify_value().
+    """
+    # Push the current value as soon as a client subscribes
+    notify_on_subscribe = True
+
+    def __init__(self, uuid, flags, service, notify_interval):
+        self.notifying = False
+        self.subscribers = 0
+        self.notify_interval = notify_interval
+        self.notify_source = None
+        Characteristic.__init__(self, uuid, flags, service)
+
+    def get_value(self):
+        raise NotImplementedError()
+
+    def ReadValue(self, options):
+        return self.get_value()
+
+    def notify_value(self):
+        value = dbus.Array(self.get_value(), signature='y')
+        self.PropertiesChanged(GATT_CHRC_IFACE, {"Value": value}, [])
+
+    def notify_callback(self):
+        if not self.notifying:
+            self.notify_source = None
+            return False
+
+        self.notify_value()
+        return True
+
+    def set_notify_interval(self, notify_interval):
+        self.notify_interval = notify_interval
+        if self.notify_source is not None:
+            self.remove_timeout(self.notify_source)
+            self.notify_source = None
+        if self.notifying and self.notify_interval is not None:
+            self.notify_source = self.add_timeout(self.notify_interval,
+                                                  self.notify_callback)
+
+    def StartNotify(self):
+        self.subscribers += 1
+        if self.notifying:
+            return
+
+        self.notifying = True
+        self.service.subscription_changed(self)
+        if self.notify_on_subscribe:
+            self.notify_value()
+        if self.notify_interval is not None:
+            self.notify_source = self.add_timeout(self.notify_interval,
+                                                  self.notify_callback)
+
+    def StopNotify(self):
+        if self.subscribers > 0:
+            self.subscribers -= 1
+        if self.subscribers > 0 or not self.notifying:
+            return
+
+        self.notifying = False
+        if self.notify_source is not None:
+            self.remove_timeout(self.notify_source)
+            self.notify_source = None
+        self.service.subscription_changed(self)
 
 
 class Descriptor(dbus.service.Object):
@@ -0,0 +1,110 @@
+import struct
+import time
+from collections import namedtuple, deque
+from itertools import islice
+
+TELEMETRY_VERSION = 2
+
+# version << 4 | direction, sequence, timestamp (unix s), rpm (+-127),
+# drum count, flow rate (0.1 L/min), total flow (0.1 L) -- little endian,
+# 20 bytes: fits the notification payload of the default 23-byte ATT MTU
+TELEMETRY_STRUCT = struct.Struct("<BIIbIHI")
+assert TELEMETRY_STRUCT.size <= 20
+
+# version, number of samples that follow
+BATCH_HEADER_STRUCT = struct.Struct("<BB")
+
+# version, rpm, direction, total flow (0.1 L) -- fits a legacy advertisement
+BROADCAST_STRUCT = struct.Struct("<BhBI")
+
+TelemetrySample = namedtuple("TelemetrySample", ["seq", "timestamp", "rpm", "direction",
+                                                 "drum_cnt", "flow_rate_lpm", "total_liters"])
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, int(value)))
+
+
+def pack_sample(sample):
+    return TELEMETRY_STRUCT.pack(
+        TELEMETRY_VERSION << 4 | sample.direction & 0x0F,
+        sample.seq & 0xFFFFFFFF,
+        int(sample.timestamp) & 0xFFFFFFFF,
+        _clamp(sample.rpm, -128, 127),
+        sample.drum_cnt & 0xFFFFFFFF,
+        _clamp(round(sample.flow_rate_lpm * 10), 0, 0xFFFF),
+        _clamp(round(sample.total_liters * 10), 0, 0xFFFFFFFF))
+
+
+def unpack_sample(data):
+    flags, seq, timestamp, rpm, drum_cnt, rate, total = TELEMETRY_STRUCT.unpack(data)
+    version, direction = flags >> 4, flags & 0x0F
+    if version != TELEMETRY_VERSION:
+        raise ValueError(f"Unsupported telemetry version {version}")
+    return TelemetrySample(seq, timestamp, rpm, direction, drum_cnt, rate / 10, total / 10)
+
+
+def pack_broadcast(sample):
+    return BROADCAST_STRUCT.pack(
+        TELEMETRY_VERSION,
+        _clamp(sample.rpm, -32768, 32767),
+        sample.direction & 0xFF,
+        _clamp(round(sample.total_liters * 10), 0, 0xFFFFFFFF))
+
+
+def pack_batch(samples):
+    return BATCH_HEADER_STRUCT.pack(TELEMETRY_VERSION, len(samples)) + \
+        b"".join(pack_sample(sample) for sample in samples)
+
+
+class TelemetrySource:
+    def __init__(self, rpm_sensor, flow_sensor, start_seq=0):
+        self.rpm_sensor = rpm_sensor
+        self.flow_sensor = flow_sensor
+        self.seq = start_seq
+
+    def sample(self):
+        self.seq += 1
+        return self.current()
+
+    def current(self):
+        # Live values under the last issued sequence number, nothing is consumed
+        rpm = self.rpm_sensor.get_snapshot()
+        flow = self.flow_sensor.get_snapshot()
+        return TelemetrySample(self.seq, time.time(), rpm.rpm, rpm.direction, rpm.drum_cnt,
+                               flow.flow_rate_lpm, flow.total_liters)
+
+
+class SampleRecorder:
+    """
+    Bounded buffer of consecutive samples taken from a TelemetrySource.
+    Sequence numbers are contiguous, so a cursor maps directly to a position.
+    """
+    def __init__(self, source, capacity):
+        self.source = source
+        self.samples = deque(maxlen=capacity)
+
+    def record(self):
+        sample = self.source.sample()
+        self.samples.append(sample)
+        return sample
+
+    def resize(self, capacity):
+        if capacity != self.samples.maxlen:
+            self.samples = deque(self.samples, maxlen=capacity)
+
+    def latest(self):
+        if not self.samples:
+            # Nothing recorded yet: a sequence number taken here would never reach the store
+            return self.source.current()
+        return self.samples[-1]
+
+    def newest_seq(self):
+        return self.samples[-1].seq if self.samples else self.source.seq
+
+    def since(self, seq, limit):
+        """Up to `limit` samples with a sequence number greater than `seq`."""
+        if not self.samples:
+            return []
+        start = max(0, seq + 1 - self.samples[0].seq)
+        return list(islice(self.samples, start, start + limit))
@@ -0,0 +1,59 @@
+import hashlib
+import os
+
+import pytest
+
+from filetransfer import (FileTransfer, START_STRUCT, DATA_HEADER_STRUCT, STATUS_STRUCT, OP_START,
+                          OP_DATA, OP_END, STATE_RECEIVING, STATE_COMPLETE, STATE_ERROR,
+                          ERROR_NONE, ERROR_OFFSET, ERROR_BAD_REQUEST)
+
+SIZE = 50000
+CHUNK = 500
+
+
+@pytest.fixture
+def transfer(tmp_path):
+    transfer = FileTransfer(str(tmp_path / "upload.bin"), ack_interval=16384, max_size=SIZE)
+    yield transfer
+    transfer.close()
+
+
+def status(transfer):
+    state, error, acked, _ = STATUS_STRUCT.unpack(transfer.status())
+    return state, error, acked
+
+
+def test_resume_after_lost_chunk(transfer):
+    # Drop a chunk mid-upload and retry from the reported offset, as a client would
+    payload = os.urandom(SIZE)
+    transfer.handle(START_STRUCT.pack(OP_START, SIZE, hashlib.sha256(payload).digest()))
+
+    offset = 0
+    dropped = False
+    writes = 0
+    while offset < SIZE:
+        writes += 1
+        assert writes <= 2 * SIZE // CHUNK, f"upload stalled at offset {offset}"
+        if offset == 20000 and not dropped:
+            # The chunk at 20000 never arrives, the next one is out of order
+            dropped = True
+            offset += CHUNK
+        transfer.handle(DATA_HEADER_STRUCT.pack(OP_DATA, offset) + payload[offset:offset + CHUNK])
+        state, error, acked = status(transfer)
+        if error == ERROR_OFFSET:
+            assert state == STATE_RECEIVING and acked <= 20000
+            offset = acked
+        else:
+            offset += CHUNK
+
+    assert dropped
+    transfer.handle(bytes([OP_END]))
+    assert status(transfer) == (STATE_COMPLETE, ERROR_NONE, SIZE)
+    with open(transfer.target_path, "rb") as file:
+        assert file.read() == payload
+
+
+def test_start_above_max_size_is_rejected(transfer):
+    transfer.handle(START_STRUCT.pack(OP_START, SIZE + 1, bytes(32)))
+    assert status(transfer) == (STATE_ERROR, ERROR_BAD_REQUEST, 0)
+    assert not os.path.exists(transfer.staging_path)
@@ -0,0 +1,74 @@
+import threading
+import time
+from contextlib import nullcontext
+
+from pulsetools import PulseCounter
+
+WRITERS = 4
+PULSES = 1000
+BATCH = 16
+EXPECTED = sum(PULSES if i % 2 == 0 else PULSES // BATCH * BATCH for i in range(WRITERS))
+
+
+class ContendedCounter(PulseCounter):
+    # Writing total yields to the other threads between the read and the
+    # store of every read-modify-write, as can happen anywhere without a GIL
+    @property
+    def total(self):
+        return self._total
+
+    @total.setter
+    def total(self, value):
+        time.sleep(0)
+        self._total = value
+
+    def __init__(self, locked=True):
+        PulseCounter.__init__(self)
+        if not locked:
+            self._lock = nullcontext()
+
+
+def hammer(counter):
+    readings = []
+    done = threading.Event()
+    # Writers start together, otherwise the first can finish before the last starts
+    start = threading.Barrier(WRITERS)
+
+    def single_edges():
+        start.wait()
+        for _ in range(PULSES):
+            counter.increment()
+
+    def batched_edges():
+        start.wait()
+        for _ in range(PULSES // BATCH):
+            counter.add(BATCH)
+
+    def reader():
+        while not done.is_set():
+            readings.append(counter.total)
+            time.sleep(0)
+
+    threads = [threading.Thread(target=single_edges if i % 2 == 0 else batched_edges)
+               for i in range(WRITERS)]
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    done.set()
+    reader_thread.join()
+    return counter.total, readings
+
+
+def test_unlocked_control_loses_pulses():
+    # Without a lost update here the locked test below could not catch a missing lock
+    counted, _ = hammer(ContendedCounter(locked=False))
+    assert counted < EXPECTED
+
+
+def test_no_pulse_lost_under_contention():
+    counted, readings = hammer(ContendedCounter())
+    assert counted == EXPECTED
+    assert all(a <= b for a, b in zip(readings, readings[1:])), "total went backwards"